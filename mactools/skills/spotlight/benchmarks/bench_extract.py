@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for every extract_text.py backend.
+
+Generates a deterministic corpus (same bytes on every run): plain text, CSV,
+JSON, a GBK log, docx, odt, multi-sheet xlsx, 500-slide pptx, PDF (written
+by a small generator here, converted by pdftotext if installed), RTF and
+zip. Each file is made at every --sizes target and extracted with every
+--max-chars budget in a fresh process, so peak RSS is per case. Reports
+p50/p95 latency, MB/s (file bytes over p50; null for truncated runs, which
+stop before reading the whole file) and peak RSS as JSON; backends that
+have no generator (binary doc/xls/ppt, pages) are listed as skipped.
+
+Pass --baseline with an earlier report to print p50 changes per case and
+--max-regression to fail (exit 1) when any case slows down past a ratio.
+
+Usage: bench_extract.py [--sizes MB,...] [--max-chars N,...] [--runs N]
+                        [--only BACKEND,...] [--corpus-dir DIR] [--out FILE]
+                        [--baseline FILE [--max-regression RATIO]]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import zipfile
+import platform
+import subprocess
+import tempfile
+import argparse
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+SCRIPTS = Path(__file__).resolve().parent.parent / "scripts"
+
+WORDS = "alpha beta gamma delta report quarter revenue status request done".split()
+CJK_WORDS = ["季度", "报告", "收入", "增长", "客户", "项目", "日志", "错误", "请求", "完成"]
+SLIDES = 500
+SHEETS = 3
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+
+def _sentence(rng, words, n=12):
+    return " ".join(rng.choice(words) for _ in range(n))
+
+
+def _lines(rng, size, words=WORDS):
+    """Lines of text totalling about size characters."""
+    lines = []
+    total = 0
+    while total < size:
+        lines.append(f"{len(lines):06d} {_sentence(rng, words)}")
+        total += len(lines[-1]) + 1
+    return lines
+
+
+def _write_zip(path, members):
+    """Write a zip with fixed timestamps; a "mimetype" member is stored."""
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in members:
+            info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+            info.compress_type = zipfile.ZIP_STORED if name == "mimetype" else zipfile.ZIP_DEFLATED
+            z.writestr(info, data)
+
+
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+OOXML = "application/vnd.openxmlformats-officedocument."
+PKG_NS = "http://schemas.openxmlformats.org/package/2006"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _content_types(overrides):
+    parts = "".join(
+        f'<Override PartName="/{name}" ContentType="{ctype}"/>' for name, ctype in overrides
+    )
+    return (
+        f'{XML_DECL}<Types xmlns="{PKG_NS}/content-types">'
+        '<Default Extension="rels"'
+        ' ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        f'<Default Extension="xml" ContentType="application/xml"/>{parts}</Types>'
+    )
+
+
+def _rels(targets):
+    rels = "".join(
+        f'<Relationship Id="rId{i}" Type="{REL_NS}/{rtype}" Target="{target}"/>'
+        for i, (rtype, target) in enumerate(targets, 1)
+    )
+    return f'{XML_DECL}<Relationships xmlns="{PKG_NS}/relationships">{rels}</Relationships>'
+
+
+def _write_ooxml(path, main, overrides, members):
+    """Write an OOXML package whose officeDocument part is main."""
+    package = [
+        ("[Content_Types].xml", _content_types(overrides)),
+        ("_rels/.rels", _rels([("officeDocument", main)])),
+    ]
+    _write_zip(path, package + members)
+
+
+def make_txt(path, size, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(_lines(rng, size)) + "\n")
+
+
+def make_gbk_log(path, size, rng):
+    """A GBK log whose first quarter is ASCII, so decoding has to switch codecs mid-file."""
+    lines = _lines(rng, size // 4) + _lines(rng, size // 2, WORDS + CJK_WORDS)
+    with open(path, "wb") as f:
+        f.write(("\n".join(lines) + "\n").encode("gbk"))
+
+
+def make_csv(path, size, rng):
+    rows = ["id,name,amount,note"]
+    total = 0
+    while total < size:
+        note = _sentence(rng, WORDS, 6)
+        rows.append(f'{len(rows)},{rng.choice(WORDS)},{rng.randint(0, 99999) / 100},"{note}"')
+        total += len(rows[-1]) + 1
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(rows) + "\n")
+
+
+def make_json(path, size, rng):
+    records = []
+    total = 0
+    while total < size:
+        text = _sentence(rng, WORDS + CJK_WORDS)
+        records.append({"id": len(records), "tags": rng.sample(WORDS, 3), "text": text})
+        total += 120
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False)
+
+
+def make_docx(path, size, rng):
+    w_ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = "".join(f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in _lines(rng, size))
+    document = f'{XML_DECL}<w:document xmlns:w="{w_ns}"><w:body>{body}</w:body></w:document>'
+    overrides = [("word/document.xml", OOXML + "wordprocessingml.document.main+xml")]
+    _write_ooxml(path, "word/document.xml", overrides, [("word/document.xml", document)])
+
+
+def make_odt(path, size, rng):
+    body = "".join(f"<text:p>{escape(line)}</text:p>" for line in _lines(rng, size))
+    content = (
+        f"{XML_DECL}<office:document-content"
+        ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+        ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">'
+        f"<office:body><office:text>{body}</office:text></office:body></office:document-content>"
+    )
+    mimetype = "application/vnd.oasis.opendocument.text"
+    _write_zip(path, [("mimetype", mimetype), ("content.xml", content)])
+
+
+def make_xlsx(path, size, rng):
+    """SHEETS sheets of rows mixing shared strings, numbers and inline text."""
+    ns = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    strings = [_sentence(rng, WORDS, 4) for _ in range(200)]
+    sheets = []
+    for n in range(1, SHEETS + 1):
+        rows = []
+        total = 0
+        while total < size // SHEETS:
+            r = len(rows) + 1
+            note = escape(_sentence(rng, WORDS, 5))
+            rows.append(
+                f'<row r="{r}"><c r="A{r}" t="s"><v>{rng.randrange(len(strings))}</v></c>'
+                f'<c r="B{r}"><v>{rng.randint(0, 99999) / 100}</v></c>'
+                f'<c r="C{r}" t="inlineStr"><is><t>{note}</t></is></c></row>'
+            )
+            total += 60
+        data = "".join(rows)
+        sheets.append(
+            f'{XML_DECL}<worksheet xmlns="{ns}"><sheetData>{data}</sheetData></worksheet>'
+        )
+
+    names = [f"worksheets/sheet{n}.xml" for n in range(1, SHEETS + 1)]
+    entries = "".join(
+        f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in range(1, SHEETS + 1)
+    )
+    workbook = (
+        f'{XML_DECL}<workbook xmlns="{ns}" xmlns:r="{REL_NS}">'
+        f"<sheets>{entries}</sheets></workbook>"
+    )
+    shared = "".join(f"<si><t>{escape(s)}</t></si>" for s in strings)
+    overrides = [("xl/workbook.xml", OOXML + "spreadsheetml.sheet.main+xml")]
+    overrides += [("xl/" + name, OOXML + "spreadsheetml.worksheet+xml") for name in names]
+    overrides.append(("xl/sharedStrings.xml", OOXML + "spreadsheetml.sharedStrings+xml"))
+    rels = [("worksheet", name) for name in names] + [("sharedStrings", "sharedStrings.xml")]
+    members = [
+        ("xl/workbook.xml", workbook),
+        ("xl/_rels/workbook.xml.rels", _rels(rels)),
+        ("xl/sharedStrings.xml", f'{XML_DECL}<sst xmlns="{ns}">{shared}</sst>'),
+    ]
+    members += [("xl/" + name, sheet) for name, sheet in zip(names, sheets)]
+    _write_ooxml(path, "xl/workbook.xml", overrides, members)
+
+
+def make_pptx(path, size, rng):
+    """SLIDES slides sharing size characters of text."""
+    p_ns = "http://schemas.openxmlformats.org/presentationml/2006/main"
+    a_ns = "http://schemas.openxmlformats.org/drawingml/2006/main"
+    per_slide = max(size // SLIDES, 20)
+    members = [("ppt/presentation.xml", f'{XML_DECL}<p:presentation xmlns:p="{p_ns}"/>')]
+    for n in range(1, SLIDES + 1):
+        runs = "".join(f"<a:r><a:t>{escape(line)}</a:t></a:r>" for line in _lines(rng, per_slide))
+        shape = f"<p:sp><p:txBody><a:p>{runs}</a:p></p:txBody></p:sp>"
+        slide = (
+            f'{XML_DECL}<p:sld xmlns:p="{p_ns}" xmlns:a="{a_ns}">'
+            f"<p:cSld><p:spTree>{shape}</p:spTree></p:cSld></p:sld>"
+        )
+        members.append((f"ppt/slides/slide{n}.xml", slide))
+    overrides = [("ppt/presentation.xml", OOXML + "presentationml.presentation.main+xml")]
+    _write_ooxml(path, "ppt/presentation.xml", overrides, members)
+
+
+def make_pdf(path, size, rng):
+    """A text PDF with 60 lines of Helvetica per page."""
+    lines = _lines(rng, size)
+    pages = [lines[i:i + 60] for i in range(0, len(lines), 60)]
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* "
+            for line in page
+        )
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{off:010d} 00000 n \n" for off in offsets).encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_rtf(path, size, rng):
+    body = "".join(line + "\\par\n" for line in _lines(rng, size))
+    with open(path, "w", encoding="ascii") as f:
+        f.write("{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Helvetica;}}\\f0\\fs20\n" + body + "}")
+
+
+def make_zip(path, size, rng):
+    members = [(f"docs/part{i:03d}.txt", "\n".join(_lines(rng, size // 50))) for i in range(50)]
+    _write_zip(path, members)
+
+
+# (case name, extension, generator); one or more per backend.
+CASES = [
+    ("txt", ".txt", make_txt),
+    ("gbk_log", ".log", make_gbk_log),
+    ("csv", ".csv", make_csv),
+    ("json", ".json", make_json),
+    ("docx", ".docx", make_docx),
+    ("odt", ".odt", make_odt),
+    ("xlsx", ".xlsx", make_xlsx),
+    ("pptx", ".pptx", make_pptx),
+    ("pdf", ".pdf", make_pdf),
+    ("rtf", ".rtf", make_rtf),
+    ("zip", ".zip", make_zip),
+]
+
+
+def make_corpus(root, sizes_mb):
+    """Write every case at every size; returns [(case, size_mb, path)]."""
+    corpus = []
+    for name, ext, make in CASES:
+        for size_mb in sizes_mb:
+            path = os.path.join(root, f"{name}_{size_mb:g}mb{ext}")
+            if not os.path.exists(path):
+                make(path, int(size_mb * 1048576), random.Random(f"{name}:{size_mb}"))
+            corpus.append((name, size_mb, path))
+    return corpus
+
+
+def run_case(path, max_chars, runs):
+    """Child process body: extract path runs times after a warm-up, print a JSON result."""
+    import resource
+    import statistics
+
+    sys.path.insert(0, str(SCRIPTS))
+    import extract_core
+
+    report = extract_core.extract_report(path, max_chars)
+    latencies = []
+    child_peaks = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        record = extract_core.extract_report(path, max_chars)
+        latencies.append((time.perf_counter() - started) * 1000)
+        child_peaks += [s["peak_rss_kb"] for s in record["subprocesses"] if s.get("peak_rss_kb") is not None]
+    latencies.sort()
+    # ru_maxrss is in bytes on macOS, KiB elsewhere.
+    scale = 1024 if sys.platform == "darwin" else 1
+    result = {
+        "backend": report["extractor"],
+        "chars": report["chars"],
+        "truncated": report["truncated"],
+        "fallback_used": report["fallback_used"],
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        # Per-converter peaks from the extraction trace; RUSAGE_CHILDREN
+        # would include our own RSS at spawn time on Linux.
+        "child_peak_rss_kb": max(child_peaks, default=None),
+    }
+    if "error" in report:
+        result["error"] = report["error"][:200]
+    print(json.dumps(result))
+
+
+def measure(case, size_mb, path, max_chars, runs):
+    proc = subprocess.run(
+        [sys.executable, __file__, "--run-case", path, str(max_chars), str(runs)],
+        capture_output=True,
+        text=True,
+    )
+    row = {"case": case, "size_mb": size_mb, "bytes": os.path.getsize(path), "max_chars": max_chars}
+    if proc.returncode != 0:
+        row["error"] = proc.stderr.strip()[-500:]
+        return row
+    row.update(json.loads(proc.stdout))
+    row["mb_per_s"] = (
+        round(row["bytes"] / 1048576 / (row["p50_ms"] / 1000), 2)
+        if row["p50_ms"] and not row["truncated"]
+        else None
+    )
+    return row
+
+
+def skipped_backends(rows):
+    """EXTRACTORS backends no case exercised, with their extensions."""
+    sys.path.insert(0, str(SCRIPTS))
+    import extract_core
+
+    covered = {row.get("backend") for row in rows}
+    missing = {}
+    for ext, backend in extract_core.EXTRACTORS.items():
+        if backend.__name__ not in covered:
+            missing.setdefault(backend.__name__, []).append(ext)
+    return [
+        {"backend": name, "extensions": exts, "reason": "no generator for this format"}
+        for name, exts in missing.items()
+    ]
+
+
+def compare(rows, baseline_path, max_regression):
+    """Print p50 ratios against a baseline report; returns the worst ratio."""
+    with open(baseline_path) as f:
+        baseline = {(r["case"], r["size_mb"], r["max_chars"]): r for r in json.load(f)["results"]}
+    worst = 0.0
+    print(
+        f"{'case':<10} {'MB':>5} {'max_chars':>10} {'base ms':>9} {'now ms':>9} {'ratio':>6}",
+        file=sys.stderr,
+    )
+    for row in rows:
+        old = baseline.get((row["case"], row["size_mb"], row["max_chars"]))
+        if not old or not old.get("p50_ms") or "p50_ms" not in row:
+            continue
+        ratio = row["p50_ms"] / old["p50_ms"]
+        worst = max(worst, ratio)
+        flag = "  REGRESSION" if max_regression and ratio > max_regression else ""
+        print(
+            f"{row['case']:<10} {row['size_mb']:>5g} {row['max_chars']:>10} "
+            f"{old['p50_ms']:>9.1f} {row['p50_ms']:>9.1f} {ratio:>6.2f}{flag}",
+            file=sys.stderr,
+        )
+    return worst
+
+
+def _numbers(spec, kind):
+    return [kind(x) for x in spec.split(",") if x.strip()]
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--run-case":
+        run_case(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark extract_text.py backends on a generated corpus"
+    )
+    parser.add_argument("--sizes", default="1,8", help="Target file sizes in MB (default: 1,8)")
+    parser.add_argument(
+        "--max-chars",
+        default="10000,1000000",
+        help="Budgets to extract with (default: 10000,1000000)",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Timed runs per case after one warm-up (default: 5)"
+    )
+    parser.add_argument("--only", help="Comma-separated case names to run (e.g. pdf,xlsx)")
+    parser.add_argument(
+        "--corpus-dir", help="Keep the corpus here and reuse it (default: a temp dir)"
+    )
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare p50 latencies with")
+    parser.add_argument(
+        "--max-regression", type=float, help="With --baseline: fail if any p50 ratio exceeds this"
+    )
+    args = parser.parse_args()
+
+    sizes = _numbers(args.sizes, float)
+    budgets = _numbers(args.max_chars, int)
+    only = set(args.only.split(",")) if args.only else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.corpus_dir or tmp
+        os.makedirs(root, exist_ok=True)
+        started = time.perf_counter()
+        corpus = [c for c in make_corpus(root, sizes) if only is None or c[0] in only]
+        print(f"corpus ready in {time.perf_counter() - started:.1f}s ({root})", file=sys.stderr)
+
+        rows = []
+        for case, size_mb, path in corpus:
+            for max_chars in budgets:
+                row = measure(case, size_mb, path, max_chars, args.runs)
+                print(
+                    f"{case:<10} {size_mb:>5g} MB  max_chars={max_chars:<8} "
+                    f"p50={row.get('p50_ms', '-')} ms  {row.get('mb_per_s') or '-'} MB/s",
+                    file=sys.stderr,
+                )
+                rows.append(row)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "results": rows,
+        "skipped": skipped_backends(rows) if only is None else [],
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        worst = compare(rows, args.baseline, args.max_regression)
+        if args.max_regression and worst > args.max_regression:
+            print(
+                f"\nFAIL: p50 slowed down {worst:.2f}x (limit {args.max_regression}x)",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
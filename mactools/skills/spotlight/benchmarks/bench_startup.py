@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for extract_text.py on a plain-text file.
+
+Runs the script under `python -X importtime` several times, after one
+discarded warm-up run that leaves any bytecode caches written, and reports
+the median total import time and wall time. Wall time is what a caller
+waits for: it also covers interpreter startup and compiling the script
+itself, which -X importtime doesn't see. Pass --baseline with another copy
+of extract_text.py (e.g. from `git show REV:path > /tmp/old.py`) to compare
+wall times, and --max-wall-ms or --max-import-ms to fail (exit 1) when
+startup regresses past a budget.
+
+Usage: bench_startup.py [--runs N] [--baseline FILE] [--max-wall-ms MS]
+                        [--max-import-ms MS]
+"""
+
+import os
+import sys
+import time
+import statistics
+import subprocess
+import tempfile
+import argparse
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "extract_text.py"
+
+# Measure startup as users see it: with bytecode caching on, even if the
+# shell running the benchmark turned it off.
+ENV = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+
+
+def run_once(script, sample):
+    """Return (total import ms, wall ms, {module: cumulative us})."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(script), sample],
+        capture_output=True,
+        text=True,
+        env=ENV,
+    )
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"{script} failed:\n{result.stderr[-2000:]}")
+    total = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        modules[name.rstrip()] = int(cumulative)
+    return total / 1000, wall, modules
+
+
+def measure(script, sample, runs):
+    run_once(script, sample)
+    imports, walls = [], []
+    modules = {}
+    for _ in range(runs):
+        import_ms, wall_ms, modules = run_once(script, sample)
+        imports.append(import_ms)
+        walls.append(wall_ms)
+    return statistics.median(imports), statistics.median(walls), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure extract_text.py cold-start time")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per script (default: 10)")
+    parser.add_argument("--baseline", help="Another extract_text.py to compare against")
+    parser.add_argument("--max-wall-ms", type=float, help="Fail if median wall time exceeds this")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if median import time exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        sample = os.path.join(root, "sample.txt")
+        with open(sample, "w") as f:
+            f.write("hello world\n" * 1000)
+
+        rows = [("current", *measure(SCRIPT, sample, args.runs))]
+        if args.baseline:
+            rows.append(("baseline", *measure(args.baseline, sample, args.runs)))
+
+    print(f"median of {args.runs} runs, plain-text file")
+    print(f"{'script':<10} {'imports ms':>11} {'wall ms':>9}")
+    for name, import_ms, wall_ms, _ in rows:
+        print(f"{name:<10} {import_ms:>11.1f} {wall_ms:>9.1f}")
+    if args.baseline:
+        current, baseline = rows[0][2], rows[1][2]
+        print(f"wall time vs baseline: {current - baseline:+.1f} ms "
+              f"({(current - baseline) / baseline:+.0%})")
+
+    # Nested imports are indented further than the single leading space.
+    top_level = [(n.strip(), us) for n, us in rows[0][3].items() if not n.startswith("  ")]
+    print("\nslowest top-level imports (current, cumulative ms):")
+    for name, us in sorted(top_level, key=lambda kv: kv[1], reverse=True)[:8]:
+        print(f"  {name:<30} {us / 1000:>6.1f}")
+
+    failed = False
+    if args.max_wall_ms is not None and rows[0][2] > args.max_wall_ms:
+        print(f"\nFAIL: wall time {rows[0][2]:.1f} ms exceeds {args.max_wall_ms} ms")
+        failed = True
+    if args.max_import_ms is not None and rows[0][1] > args.max_import_ms:
+        print(f"\nFAIL: import time {rows[0][1]:.1f} ms exceeds {args.max_import_ms} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Check _extract_strings (the .xls/.ppt fallback) against strings(1).
+
+Builds two fixtures in a temp directory -- a SQLite database holding a few
+ASCII sentences and a random binary blob with ASCII, UTF-16LE and UTF-8
+text embedded. Every line strings(1) prints for the database (at least 4
+characters with a word character in it) must come out of the scanner
+intact, and the strings embedded in the blob must be found (its random
+noise is left out of the comparison). Exits non-zero on any mismatch.
+
+Usage: check_strings.py
+"""
+
+import os
+import re
+import sys
+import random
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from extract_core import _extract_strings  # noqa: E402
+
+SENTENCES = ["invoice number seven", "meeting notes about the quarterly budget", "hello world again"]
+EMBEDDED = {
+    "ascii": "internationalization",
+    "utf-16-le": "会议记录和季度预算报告",
+    "utf-16-le ascii": "Hello UTF16 world",
+    "utf-8": "中文UTF8文本内容",
+}
+
+
+def make_fixtures(root):
+    db_path = os.path.join(root, "notes.db")
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE t (a TEXT)")
+    db.executemany("INSERT INTO t VALUES (?)", [(s,) for s in SENTENCES])
+    db.commit()
+    db.close()
+
+    rng = random.Random(0)
+    noise = lambda n: bytes(rng.randrange(256) for _ in range(n))  # noqa: E731
+    blob = b"".join([
+        noise(3000), b"\x01\x02", EMBEDDED["ascii"].encode(), b"\x03",
+        noise(500), EMBEDDED["utf-16-le"].encode("utf-16-le"), b"\x00\x00",
+        EMBEDDED["utf-16-le ascii"].encode("utf-16-le"), b"\x00\x00",
+        EMBEDDED["utf-8"].encode(), b"\x00", noise(500),
+    ])
+    blob_path = os.path.join(root, "blob.bin")
+    with open(blob_path, "wb") as f:
+        f.write(blob)
+    return db_path, blob_path
+
+
+def strings_lines(path):
+    out = subprocess.run(["strings", path], capture_output=True, check=True).stdout
+    lines = out.decode("ascii", "replace").splitlines()
+    return [line.strip() for line in lines if len(line.strip()) >= 4 and re.search(r"\w", line)]
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        db_path, blob_path = make_fixtures(root)
+        text = "".join(_extract_strings(db_path, 10**6))
+        if shutil.which("strings"):
+            for expected in strings_lines(db_path):
+                if expected not in text:
+                    failures.append(f"notes.db: strings(1) has {expected!r}")
+        else:
+            print("strings(1) not found; only checking the known text")
+        failures += [f"notes.db: missing {s!r}" for s in SENTENCES if s not in text]
+        text = "".join(_extract_strings(blob_path, 10**6))
+        failures += [f"blob.bin: missing {k} {s!r}" for k, s in EMBEDDED.items() if s not in text]
+
+    for failure in failures:
+        print(failure)
+    print("FAIL" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Client side of the extract_text.py daemon (see 'extract_text.py serve').
+
+A single-file run with --socket only sends a request and prints the record
+that comes back, so that path lives here, importing just socket and json,
+rather than in extract_core.py with the backends it doesn't need.
+"""
+
+import os
+
+TRUNCATED_MARKER = "... [truncated]"
+
+# The flags forward() understands; anything else (--pages, --chunk-size,
+# --batch, -h, ...) goes through the full command line in extract_core.py.
+CLIENT_OPTIONS = {"--max-chars", "--sheet", "--pdf-jobs", "--format", "--socket", "--cache-dir"}
+CLIENT_SWITCHES = {"--tail", "--profile", "--no-cache"}
+SUBCOMMANDS = {"serve", "index", "search", "watch"}
+
+
+def connect_daemon(socket_path):
+    """Connect to a running daemon, or return None if none is listening."""
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def daemon_records(sock, paths, max_chars, use_cache=True, options=None):
+    """Send paths over a connected daemon socket and yield its records."""
+    import json
+    import socket
+
+    with sock:
+        with sock.makefile("wb") as w:
+            for p in paths:
+                req = {
+                    "path": os.path.abspath(p),
+                    "max_chars": max_chars,
+                    "no_cache": not use_cache,
+                    "options": options or {},
+                }
+                w.write(json.dumps(req, ensure_ascii=False).encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as r:
+            for line in r:
+                yield json.loads(line)
+
+
+def mark_truncated(text, truncated, tail=False):
+    """Add the truncation marker where text was cut."""
+    if not truncated:
+        return text
+    if tail:
+        return TRUNCATED_MARKER + "\n" + text
+    return text.rstrip("\n") + "\n" + TRUNCATED_MARKER
+
+
+def print_record(filepath, record, fmt="text", tail=False):
+    """Print a single-file record as JSON, or as a header and the text."""
+    if fmt == "json":
+        import json
+
+        print(json.dumps(record, ensure_ascii=False))
+        return
+    text = record.get("text", record.get("error", ""))
+    text = mark_truncated(text, record.get("truncated"), tail)
+
+    # Output header
+    size = os.path.getsize(filepath)
+    size_str = (
+        f"{size / 1048576:.1f} MB"
+        if size >= 1048576
+        else f"{size / 1024:.1f} KB" if size >= 1024 else f"{size} B"
+    )
+    ext = os.path.splitext(filepath)[1].lower()
+    print(f"File: {os.path.basename(filepath)}")
+    print(f"Path: {filepath}")
+    print(f"Format: {ext} | Size: {size_str}")
+    for failed in record.get("failed_ranges", []):
+        print(f"[Note] pages {failed['pages']} missing: {failed['error']}")
+    print(f"{'=' * 60}")
+    print(text)
+
+
+def forward(argv):
+    """Answer a single-file command line from a running daemon.
+
+    Returns False without printing anything if argv asks for more than
+    this client handles (see CLIENT_OPTIONS), names a missing file, or no
+    daemon is listening; the caller then runs the full command line, which
+    reports errors and extracts locally.
+    """
+    if argv and argv[0] in SUBCOMMANDS:
+        return False
+    values, switches, paths = {}, set(), []
+    args = iter(argv)
+    for arg in args:
+        name, eq, value = arg.partition("=")
+        if name in CLIENT_OPTIONS:
+            if not eq:
+                value = next(args, None)
+                if value is None:
+                    return False
+            values[name] = value
+        elif arg in CLIENT_SWITCHES:
+            switches.add(arg)
+        elif arg.startswith("-") or paths:
+            return False
+        else:
+            paths.append(arg)
+
+    try:
+        max_chars = int(values.get("--max-chars", 50000))
+        pdf_jobs = int(values["--pdf-jobs"]) if "--pdf-jobs" in values else None
+    except ValueError:
+        return False
+    fmt = values.get("--format", "text")
+    socket_path = values.get("--socket", os.environ.get("EXTRACT_TEXT_SOCKET"))
+    if not paths or fmt not in ("text", "json") or not socket_path:
+        return False
+    filepath = os.path.expanduser(paths[0])
+    if not os.path.exists(filepath):
+        return False
+    sock = connect_daemon(os.path.expanduser(socket_path))
+    if sock is None:
+        return False
+
+    tail = "--tail" in switches
+    options = {
+        "tail": tail,
+        "sheet": values.get("--sheet"),
+        "pages": None,
+        "pdf_jobs": pdf_jobs,
+        "profile": "--profile" in switches or None,
+    }
+    use_cache = "--no-cache" not in switches
+    record = next(daemon_records(sock, [filepath], max_chars, use_cache, options))
+    print_record(filepath, record, fmt, tail)
+    return True
@@ -0,0 +1,3453 @@
+"""Implementation of extract_text.py: the extraction backends, cache, batch
+runner, daemon and the index, search and watch subcommands.
+
+extract_text.py is the entry point and documents the usage.
+"""
+
+import sys
+import os
+import codecs
+import time
+import re
+import argparse
+from contextlib import closing, contextmanager, nullcontext
+from contextvars import ContextVar
+
+from extract_client import connect_daemon, daemon_records, mark_truncated, print_record
+
+# Backends import what they need (subprocess, zipfile, xml.etree, json,
+# sqlite3, ...) on first use, so reading a .txt file only pays for the
+# modules above. See benchmarks/bench_startup.py.
+
+# Extractors are generators: they yield text chunks and the caller stops
+# pulling (and closes the generator) once --max-chars is reached, so a
+# backend never converts more of a document than the caller will keep.
+CHUNK_CHARS = 65536
+
+
+# Resource limits for converter subprocesses (textutil, pdftotext, ...), so a
+# pathological document can't balloon memory or spin forever.
+SUBPROCESS_MEMORY_BYTES = 2 * 1073741824
+SUBPROCESS_CPU_SECONDS = 120
+
+
+def _limited(cmd):
+    """cmd with its executable resolved and run under the subprocess limits.
+
+    The limits are set by a /bin/sh that then execs the command, rather
+    than by a Popen preexec_fn: that would force a fork() of this process
+    (unsafe with threads, and the child's peak RSS would include ours),
+    where without one subprocess can use posix_spawn(). Raises
+    FileNotFoundError if the executable isn't on PATH, like Popen.
+    """
+    import errno
+    import shutil
+
+    path = shutil.which(cmd[0])
+    if path is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), cmd[0])
+    if os.name != "posix":
+        return [path] + cmd[1:]
+    # ulimit -v is in KiB; failures (e.g. macOS refusing RLIMIT_AS below
+    # the current mapping) are ignored.
+    script = (f"ulimit -v {SUBPROCESS_MEMORY_BYTES // 1024} 2>/dev/null; "
+              f"ulimit -t {SUBPROCESS_CPU_SECONDS} 2>/dev/null; "
+              'exec "$0" "$@"')
+    return ["/bin/sh", "-c", script, path] + cmd[1:]
+
+
+def output_budget(max_chars):
+    """Bytes of converter output enough for max_chars characters (UTF-8 needs
+    at most 4 bytes each), plus room for whitespace that gets stripped."""
+    return 4 * max_chars + 1048576
+
+
+def _reap(proc, cmd, started, stopped=None):
+    """Wait for proc and note its wall time, CPU time and peak RSS in the
+    current extraction trace (see extract_report())."""
+    usage = None
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        proc.wait()
+    trace = _trace.get()
+    if trace is None:
+        return
+    stats = {
+        "cmd": os.path.basename(cmd[0]),
+        "exit": proc.returncode,
+        "wall_ms": _ms(started, time.perf_counter()),
+    }
+    if usage is not None:
+        # ru_maxrss is in bytes on macOS, KiB elsewhere.
+        peak = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        if sys.platform.startswith("linux"):
+            import resource
+
+            # Linux charges exec() with the peak RSS of the address space it
+            # replaces -- ours, for a vforked child -- so a peak that isn't
+            # above our own says nothing about the child.
+            if peak <= resource.getrusage(resource.RUSAGE_SELF).ru_maxrss:
+                peak = None
+        stats.update(cpu_ms=round((usage.ru_utime + usage.ru_stime) * 1000, 1), peak_rss_kb=peak)
+    if stopped:
+        stats["stopped"] = stopped
+    trace.setdefault("subprocesses", []).append(stats)
+
+
+def run_streaming(cmd, timeout, max_bytes=None, on_spawn=None):
+    """Run cmd and yield its stdout as decoded text chunks.
+
+    The child runs under SUBPROCESS_MEMORY_BYTES/SUBPROCESS_CPU_SECONDS
+    rlimits and is killed as soon as the consumer stops iterating or its
+    output passes max_bytes, so callers only pay for the output they
+    actually use. on_spawn(proc) is called once the child has started.
+    Raises TimeoutExpired when the wall-clock timeout fires and
+    CalledProcessError on a non-zero exit.
+    """
+    import subprocess
+    import tempfile
+    import threading
+
+    timed_out = []
+    stopped = None
+    eof = False
+
+    def kill():
+        timed_out.append(True)
+        proc.kill()
+
+    with tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        # close_fds=False lets subprocess use posix_spawn(); our own
+        # descriptors are non-inheritable anyway.
+        proc = subprocess.Popen(_limited(cmd), stdout=subprocess.PIPE, stderr=err, close_fds=False)
+        if on_spawn is not None:
+            on_spawn(proc)
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        remaining = max_bytes
+        try:
+            while True:
+                data = proc.stdout.read1(CHUNK_CHARS)
+                if not data:
+                    eof = True
+                    break
+                if remaining is not None:
+                    if len(data) >= remaining:
+                        data = data[:remaining]
+                        stopped = "output budget"
+                    remaining -= len(data)
+                text = decoder.decode(data, final=stopped is not None)
+                if text:
+                    yield text
+                if stopped:
+                    break
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+        except GeneratorExit:
+            stopped = "closed"
+            raise
+        finally:
+            timer.cancel()
+            if not eof:
+                proc.kill()
+            proc.stdout.close()
+            _reap(proc, cmd, started, stopped)
+
+        if timed_out:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if proc.returncode != 0 and not stopped:
+            err.seek(0)
+            stderr = err.read().decode("utf-8", "replace")
+            if not stderr.strip() and proc.returncode < 0:
+                import signal
+
+                stderr = f"killed by {signal.Signals(-proc.returncode).name}"
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+
+
+def _strip_stream(chunks, leading=None):
+    """Strip leading and trailing whitespace from a chunk stream.
+
+    leading, if given, is the set of characters stripped from the start
+    (as for str.lstrip()); the end is stripped of all whitespace.
+    """
+    pending = ""
+    started = False
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip(leading)
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            yield pending + body
+            pending = chunk[len(body):]
+        else:
+            pending += chunk
+
+
+def _iter_lines(chunks):
+    """Re-split a chunk stream into lines, keeping line endings."""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.splitlines(keepends=True)
+        if lines and not lines[-1].endswith(("\n", "\r")):
+            pending = lines.pop()
+        else:
+            pending = ""
+        yield from lines
+    if pending:
+        yield pending
+
+
+# Per-extraction notes (e.g. whether a fallback ran), set by extract_report().
+# A context variable so concurrent extractions in daemon threads don't mix.
+_trace = ContextVar("extract_text_trace", default=None)
+
+
+class ExtractError(str):
+    """A backend's error message, yielded as its first chunk when it can't
+    read the file at all.
+
+    Consumers check the type, not the "[Error]" prefix, so a text file that
+    starts with "[Error]" (a log, say) is still text.
+    """
+
+
+def _error(message, produced=False):
+    """The chunk reporting a backend failure: an ExtractError, or a plain
+    "[Error]" line when some text has already been produced."""
+    return f"\n[Error] {message}" if produced else ExtractError(f"[Error] {message}")
+
+
+def _note_fallback():
+    trace = _trace.get()
+    if trace is not None:
+        trace["fallback_used"] = True
+
+
+def _with_fallback(chunks, fallback):
+    """Yield from chunks, or from fallback() if the first chunk is an error."""
+    first = next(chunks, "")
+    if isinstance(first, ExtractError):
+        chunks.close()
+        _note_fallback()
+        yield from fallback()
+        return
+    yield first
+    yield from chunks
+
+
+# read_direct reads one prefix of this size, sniffs the encoding from it and
+# then decodes the rest of the file incrementally in CHUNK_BYTES blocks.
+SNIFF_BYTES = 65536
+CHUNK_BYTES = 65536
+# Tried in order when there is no BOM; latin-1 decodes anything.
+TEXT_ENCODINGS = ["utf-8", "gbk", "latin-1"]
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def sniff_encoding(head, final=False):
+    """Guess the encoding of a byte prefix: BOM first, then the first
+    candidate in TEXT_ENCODINGS that decodes it. final says whether head is
+    the whole file (otherwise a multi-byte sequence may be cut at the end).
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    for encoding in TEXT_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(head, final=final)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return TEXT_ENCODINGS[-1]
+
+
+@contextmanager
+def _mapped(filepath):
+    """Map filepath read-only; yields b"" for an empty file."""
+    import mmap
+
+    with open(filepath, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped.
+            yield b""
+            return
+        with mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            yield mm
+
+
+def read_direct(filepath, max_chars, **options):
+    """Read text files directly.
+
+    The file is memory-mapped: the encoding is sniffed from the first block
+    and the rest is decoded incrementally, so the caller can stop after
+    max_chars without the whole file ever being paged in. If a later block
+    doesn't decode (e.g. a GBK log with an ASCII-only head), decoding
+    switches to the next candidate encoding from that block on.
+    """
+    import io
+
+    with _mapped(filepath) as mm:
+        size = len(mm)
+        block = mm[:SNIFF_BYTES]
+        pos = len(block)
+        encoding = sniff_encoding(block, final=pos >= size)
+        if encoding in TEXT_ENCODINGS:
+            candidates = TEXT_ENCODINGS[TEXT_ENCODINGS.index(encoding) + 1:]
+        else:
+            candidates = TEXT_ENCODINGS[-1:]
+        decoder = codecs.getincrementaldecoder(encoding)()
+        # Same universal-newline handling as text-mode open().
+        newlines = io.IncrementalNewlineDecoder(None, translate=True)
+
+        while True:
+            final = not block
+            pending = decoder.getstate()[0]
+            try:
+                text = decoder.decode(block, final=final)
+            except UnicodeDecodeError:
+                if not candidates:
+                    yield _error(f"Unable to decode {filepath} with supported encodings")
+                    return
+                decoder = codecs.getincrementaldecoder(candidates.pop(0))()
+                block = pending + block
+                continue
+            text = newlines.decode(text, final=final)
+            if text:
+                yield text
+            if final:
+                return
+            block = mm[pos:pos + CHUNK_BYTES]
+            pos += len(block)
+
+
+def read_tail(filepath, max_chars):
+    """Return (text, truncated) for the last max_chars characters of a text file.
+
+    Only the last max_chars * 4 bytes are decoded (no supported encoding
+    needs more per character), starting at a line boundary so multi-byte
+    sequences aren't split; the start of the file is never scanned.
+    """
+    with _mapped(filepath) as mm:
+        size = len(mm)
+        head = mm[:SNIFF_BYTES]
+        encoding = sniff_encoding(head, final=size <= SNIFF_BYTES)
+        start = max(0, size - max_chars * 4)
+
+        if encoding in ("utf-16", "utf-32"):
+            unit = 2 if encoding == "utf-16" else 4
+            start = max(start - start % unit, unit)
+            skipped = start > unit
+            # Re-attach the BOM so the codec knows the byte order.
+            data = head[:unit] + mm[start:]
+        else:
+            if start > 0:
+                newline = mm.find(b"\n", start)
+                if newline != -1:
+                    start = newline + 1
+                if encoding == "utf-8-sig":
+                    encoding = "utf-8"
+            skipped = start > 0
+            data = mm[start:]
+            if skipped and encoding in TEXT_ENCODINGS:
+                encoding = sniff_encoding(data, final=True)
+
+    text = data.decode(encoding, "replace").replace("\r\n", "\n").replace("\r", "\n")
+    truncated = skipped or len(text) > max_chars
+    return text[len(text) - max_chars:] if len(text) > max_chars else text, truncated
+
+
+# read_csv(profile=True): files up to CSV_PROFILE_BYTES are scanned in full,
+# larger ones in CSV_PROFILE_WINDOWS evenly spaced windows of the same total
+# size; either way scanning takes at most about CSV_PROFILE_SECONDS.
+CSV_PROFILE_BYTES = 32 * 1048576
+CSV_PROFILE_WINDOWS = 32
+CSV_PROFILE_SECONDS = 5.0
+CSV_SAMPLE_ROWS = 20
+CSV_NULLS = {"", "null", "NULL", "Null", "NA", "N/A", "n/a", "None", "nan", "NaN", "-"}
+# Value classes, most specific first; a column gets the first one that all of
+# its non-null values fit (see _column_type).
+CSV_VALUE_TYPES = [
+    ("int", re.compile(r"[+-]?\d+")),
+    ("float", re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")),
+    ("bool", re.compile(r"true|false|TRUE|FALSE|True|False|yes|no|YES|NO|Yes|No")),
+    ("date", re.compile(r"\d{4}-\d{2}-\d{2}|\d{4}/\d{1,2}/\d{1,2}")),
+    ("datetime", re.compile(
+        r"\d{4}[-/]\d{1,2}[-/]\d{1,2}[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?"
+        r"(?:Z|[+-]\d{2}:?\d{2})?")),
+]
+# Which class a column with several value classes widens to.
+CSV_TYPE_WIDENING = {
+    frozenset({"int", "float"}): "float",
+    frozenset({"date", "datetime"}): "datetime",
+}
+
+
+class _ColumnStats:
+    """Running null count, value classes and min/max of one CSV column."""
+
+    def __init__(self, name):
+        self.name = name
+        self.nulls = 0
+        self.types = set()
+        self.num_min = self.num_max = None
+        self.str_min = self.str_max = None
+
+    def add(self, value):
+        value = value.strip()
+        if value in CSV_NULLS:
+            self.nulls += 1
+            return
+        kind = "string"
+        for name, pattern in CSV_VALUE_TYPES:
+            if pattern.fullmatch(value):
+                kind = name
+                break
+        self.types.add(kind)
+        if kind in ("int", "float"):
+            number = float(value)
+            if self.num_min is None or number < self.num_min:
+                self.num_min = number
+            if self.num_max is None or number > self.num_max:
+                self.num_max = number
+        if self.str_min is None or value < self.str_min:
+            self.str_min = value
+        if self.str_max is None or value > self.str_max:
+            self.str_max = value
+
+    def kind(self):
+        if not self.types:
+            return "empty"
+        if len(self.types) == 1:
+            return next(iter(self.types))
+        return CSV_TYPE_WIDENING.get(frozenset(self.types), "string")
+
+    def describe(self, rows):
+        kind = self.kind()
+        parts = [kind, f"nulls {self.nulls}/{rows}"]
+        if kind in ("int", "float"):
+            low, high = self.num_min, self.num_max
+            if kind == "int":
+                low, high = int(low), int(high)
+            parts.append(f"min {low:g}" if kind == "float" else f"min {low}")
+            parts.append(f"max {high:g}" if kind == "float" else f"max {high}")
+        elif self.str_min is not None:
+            parts.append(f"min {_clip(self.str_min)!r}")
+            parts.append(f"max {_clip(self.str_max)!r}")
+        return f"{self.name}: " + ", ".join(parts)
+
+
+def _clip(value, width=40):
+    return value if len(value) <= width else value[:width - 3] + "..."
+
+
+def _csv_windows(mm, size, encoding):
+    """Byte ranges to scan, each starting and ending on a line boundary."""
+    if size <= CSV_PROFILE_BYTES or encoding.startswith(("utf-16", "utf-32")):
+        return [(0, size)]
+    span = CSV_PROFILE_BYTES // CSV_PROFILE_WINDOWS
+    windows = []
+    for i in range(CSV_PROFILE_WINDOWS):
+        start = i * size // CSV_PROFILE_WINDOWS
+        if start:
+            start = mm.find(b"\n", start) + 1
+        end = mm.find(b"\n", start + span) + 1
+        if start <= 0 and i or (windows and start < windows[-1][1]):
+            continue
+        windows.append((start, end or size))
+    return windows
+
+
+def _window_lines(mm, start, end, encoding, counter):
+    """Decoded lines of mm[start:end]; counter[0] accumulates their length."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    chunks = (
+        decoder.decode(mm[pos:min(pos + CHUNK_BYTES, end)], final=pos + CHUNK_BYTES >= end)
+        for pos in range(start, end, CHUNK_BYTES)
+    )
+    for line in _iter_lines(chunks):
+        counter[0] += len(line)
+        yield line
+
+
+def profile_csv(filepath, max_chars, **options):
+    """Summarize a CSV/TSV file instead of printing its rows.
+
+    One bounded pass (see CSV_PROFILE_BYTES and CSV_PROFILE_SECONDS) reports
+    the sniffed dialect, column names and inferred types, per-column null
+    counts and min/max, an approximate row count extrapolated from the file
+    size, and a reservoir sample of rows from across the scanned windows.
+    """
+    import csv
+    import random
+
+    started = time.monotonic()
+    with _mapped(filepath) as mm:
+        size = len(mm)
+        head = bytes(mm[:SNIFF_BYTES])
+        encoding = sniff_encoding(head, final=len(head) >= size)
+        sample_text = head.decode(encoding, errors="replace")
+        bytes_per_char = len(head) / max(1, len(sample_text))
+        if len(head) < size:
+            sample_text = sample_text[:sample_text.rfind("\n") + 1] or sample_text
+        sniffer = csv.Sniffer()
+        try:
+            dialect = sniffer.sniff(sample_text, delimiters=",\t;|")
+        except csv.Error:
+            dialect = csv.excel_tab if file_ext(filepath) == ".tsv" else csv.excel
+        try:
+            has_header = sniffer.has_header(sample_text)
+        except csv.Error:
+            has_header = True
+
+        windows = _csv_windows(mm, size, encoding)
+        rng = random.Random(0)
+        sample = []
+        columns = []
+        rows = ragged = 0
+        consumed = [0]
+        width = None
+        complete = True
+        try:
+            for index, (start, end) in enumerate(windows):
+                # Each window gets an equal share of the time budget, so a
+                # slow file is still sampled from end to end.
+                deadline = started + CSV_PROFILE_SECONDS * (index + 1) / len(windows)
+                reader = csv.reader(_window_lines(mm, start, end, encoding, consumed), dialect)
+                if index == 0 and has_header:
+                    header = next(reader, None)
+                    if header is not None:
+                        columns = [_ColumnStats(name.strip() or f"column {i + 1}")
+                                   for i, name in enumerate(header)]
+                        width = len(header)
+                for row in reader:
+                    if not row:
+                        continue
+                    if width is None:
+                        width = len(row)
+                    if len(row) != width:
+                        ragged += 1
+                    while len(columns) < len(row):
+                        columns.append(_ColumnStats(f"column {len(columns) + 1}"))
+                    for stats, value in zip(columns, row):
+                        stats.add(value)
+                    rows += 1
+                    # Reservoir sampling (algorithm R) over every scanned row.
+                    if len(sample) < CSV_SAMPLE_ROWS:
+                        sample.append(row)
+                    else:
+                        slot = rng.randrange(rows)
+                        if slot < CSV_SAMPLE_ROWS:
+                            sample[slot] = row
+                    if rows % 256 == 0 and time.monotonic() > deadline:
+                        complete = False
+                        break
+        except csv.Error as e:
+            yield _error(f"Failed to parse csv: {e}")
+            return
+    elapsed = time.monotonic() - started
+
+    delimiter = {"\t": "tab", " ": "space"}.get(dialect.delimiter, repr(dialect.delimiter))
+    yield (f"[CSV profile] delimiter {delimiter} | quote {dialect.quotechar!r} | "
+           f"header: {'yes' if has_header else 'no'} | encoding {encoding}\n")
+    if complete and len(windows) == 1:
+        yield f"Rows: {rows} (scanned the whole file in {elapsed:.1f} s)\n"
+    else:
+        # Extrapolate from the average row length in the scanned part.
+        scanned = consumed[0] * bytes_per_char
+        estimate = round(rows * size / scanned) if scanned else 0
+        how = f"{len(windows)} windows" if len(windows) > 1 else "one pass"
+        yield (f"Rows: ~{estimate} (estimated from {size} bytes; scanned {rows} rows, "
+               f"{scanned / size:.1%} of the file, in {how}"
+               f"{'' if complete else ' cut short by the time budget'}, {elapsed:.1f} s)\n")
+    if ragged:
+        yield f"Rows with a different column count: {ragged}\n"
+    yield f"\nColumns ({len(columns)}):\n"
+    for i, stats in enumerate(columns, 1):
+        yield f"  {i}. {stats.describe(rows)}\n"
+    if sample:
+        yield f"\nSample ({len(sample)} rows):\n"
+        if columns:
+            yield " | ".join(stats.name for stats in columns) + "\n"
+        for row in sample:
+            yield " | ".join(row) + "\n"
+
+
+def read_csv(filepath, max_chars, profile=False, **options):
+    """Read CSV/TSV with basic formatting, or a profile_csv() summary."""
+    import csv
+
+    if profile:
+        yield from profile_csv(filepath, max_chars, **options)
+        return
+    dialect = csv.excel_tab if file_ext(filepath) == ".tsv" else csv.excel
+    lines = _iter_lines(read_direct(filepath, max_chars))
+    try:
+        for row in csv.reader(lines, dialect):
+            yield " | ".join(row) + "\n"
+    except csv.Error as e:
+        yield _error(f"Failed to parse csv: {e}")
+
+
+# One JSON token after optional whitespace. Numbers are matched loosely and
+# copied through unchanged.
+_JSON_TOKEN = re.compile(
+    r'[ \t\r\n]*(?:(?P<str>"[^"\\]*(?:\\.[^"\\]*)*")|(?P<punct>[{}\[\]:,])'
+    r"|(?P<atom>-?[0-9][0-9.eE+-]*|true|false|null))"
+)
+_JSON_CLOSERS = {"}": "{", "]": "["}
+
+
+def _json_incomplete(rest):
+    """Whether rest could be the start of a token cut off by a chunk boundary."""
+    rest = rest.lstrip(" \t\r\n")
+    if rest.startswith('"'):
+        return True
+    return bool(rest) and (
+        re.fullmatch(r"-?[0-9][0-9.eE+-]*|-", rest) is not None
+        or any(word.startswith(rest) for word in ("true", "false", "null"))
+    )
+
+
+def read_json(filepath, max_chars, **options):
+    """Read JSON (or NDJSON) with pretty formatting.
+
+    A streaming tokenizer re-indents the text as it is read, so output
+    starts with the first bytes of the file and a document larger than
+    max_chars is formatted up to the point where the caller stops. Layout
+    matches json.dumps(indent=2, ensure_ascii=False); several top-level
+    values (JSON Lines) come out one after another. Text that isn't JSON is
+    passed through unchanged from the first bad token on.
+    """
+    import json
+
+    chunks = read_direct(filepath, max_chars)
+    out = []
+    out_len = 0
+    raw = []  # input seen before the first yield, for a verbatim fallback
+    stack = []
+    opened = False  # stack[-1] is an opener not yet written (it may be {} or [])
+    top_done = False  # a top-level value just ended
+    # What may come next: "after" (a value ended: "," or a closer, or at top
+    # level another value), "value", "first" (a value or "]"), "key",
+    # "first_key" (a key or "}") or "colon".
+    expect = "after"
+    buf = ""
+
+    def emit(text):
+        nonlocal out_len
+        out.append(text)
+        out_len += len(text)
+
+    def before_value():
+        nonlocal opened, top_done
+        if opened:
+            emit(stack[-1] + "\n" + "  " * len(stack))
+            opened = False
+        elif top_done:
+            emit("\n")
+            top_done = False
+
+    with closing(chunks):
+        for chunk in chunks:
+            if isinstance(chunk, ExtractError) and raw == [] and not buf:
+                yield chunk
+                return
+            buf += chunk
+            pos = 0
+            bad = False
+            while True:
+                m = _JSON_TOKEN.match(buf, pos)
+                if m is None or (m.lastgroup == "atom" and m.end() == len(buf)):
+                    break
+                kind, token = m.lastgroup, m.group(m.lastgroup)
+                value_ok = expect in ("value", "first") or (expect == "after" and not stack)
+                if kind == "str" and "\\" in token:
+                    try:
+                        token = json.dumps(json.loads(token), ensure_ascii=False)
+                    except ValueError:
+                        pass
+                if kind == "punct":
+                    if token in "{[":
+                        if not value_ok:
+                            bad = True
+                            break
+                        before_value()
+                        stack.append(token)
+                        opened = True
+                        expect = "first_key" if token == "{" else "first"
+                    elif token in "}]":
+                        empty = "first_key" if token == "}" else "first"
+                        if not stack or stack[-1] != _JSON_CLOSERS[token] or expect not in ("after", empty):
+                            bad = True
+                            break
+                        if opened:
+                            emit(stack[-1] + token)
+                            opened = False
+                        else:
+                            emit("\n" + "  " * (len(stack) - 1) + token)
+                        stack.pop()
+                        top_done = not stack
+                        expect = "after"
+                    elif token == ",":
+                        if expect != "after" or not stack:
+                            bad = True
+                            break
+                        emit(",\n" + "  " * len(stack))
+                        expect = "key" if stack[-1] == "{" else "value"
+                    else:
+                        if expect != "colon":
+                            bad = True
+                            break
+                        emit(": ")
+                        expect = "value"
+                elif kind == "str" and expect in ("key", "first_key"):
+                    before_value()
+                    emit(token)
+                    expect = "colon"
+                elif not value_ok:
+                    bad = True
+                    break
+                else:
+                    expect = "after"
+                    before_value()
+                    emit(token)
+                    top_done = not stack
+                pos = m.end()
+
+            rest = buf[pos:]
+            if not bad and _json_incomplete(rest) and len(rest) <= max_chars:
+                buf = rest
+            elif rest.strip():
+                # Not JSON (or a token too long to hold): the rest goes out as is.
+                if raw is not None:
+                    raw.append(chunk)
+                    yield "".join(raw)
+                else:
+                    before_value()
+                    emit(rest.lstrip(" \t\r\n"))
+                    yield "".join(out)
+                yield from chunks
+                return
+            else:
+                buf = ""
+            if out_len >= CHUNK_CHARS:
+                yield "".join(out)
+                raw = None
+                out.clear()
+                out_len = 0
+            elif raw is not None:
+                raw.append(chunk)
+
+    if buf.strip():
+        before_value()
+        emit(buf.lstrip(" \t\r\n"))
+    if out:
+        yield "".join(out)
+
+
+def extract_textutil(filepath, max_chars, **options):
+    """Extract text using macOS textutil (doc, docx, rtf, odt, pages)."""
+    import subprocess
+
+    cmd = ["textutil", "-convert", "txt", "-stdout", filepath]
+    produced = False
+    try:
+        with closing(run_streaming(cmd, timeout=30, max_bytes=output_budget(max_chars))) as stream:
+            for chunk in _strip_stream(stream):
+                produced = True
+                yield chunk
+    except FileNotFoundError:
+        yield _error("textutil not found")
+        return
+    except subprocess.TimeoutExpired:
+        yield _error("textutil timed out", produced)
+        return
+    except subprocess.CalledProcessError as e:
+        yield _error(f"textutil failed: {e.stderr.strip()}", produced)
+        return
+    if not produced:
+        yield _error("textutil failed: no output")
+
+
+def iter_xml_blocks(source, tags):
+    """Stream an XML document and yield each complete element whose tag is
+    in tags (outermost match only).
+
+    Elements are parsed with iterparse and dropped from their parent once
+    the caller has seen them, so memory stays flat however long the
+    document is, and parsing stops as soon as the caller stops iterating.
+    """
+    import xml.etree.ElementTree as ET
+
+    stack = []
+    depth = 0
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if elem.tag in tags:
+                depth += 1
+            continue
+        stack.pop()
+        if elem.tag not in tags:
+            continue
+        depth -= 1
+        if depth == 0:
+            yield elem
+            # Every earlier sibling is finished too, so the parent can drop
+            # all of its children.
+            if stack:
+                del stack[-1][:]
+
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+S_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+ODF_TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+ODF_TABLE_NS = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+
+
+def _docx_paragraph(p):
+    """Text of a <w:p>, keeping tabs and line breaks."""
+    parts = []
+    for elem in p.iter():
+        if elem.tag == W_NS + "t":
+            parts.append(elem.text or "")
+        elif elem.tag == W_NS + "tab":
+            parts.append("\t")
+        elif elem.tag in (W_NS + "br", W_NS + "cr"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _odf_paragraph(elem):
+    """Text of a <text:p>/<text:h>, expanding spaces, tabs and breaks."""
+    parts = [elem.text or ""]
+    for child in elem:
+        if child.tag == ODF_TEXT_NS + "s":
+            parts.append(" " * int(child.get(ODF_TEXT_NS + "c", "1")))
+        elif child.tag == ODF_TEXT_NS + "tab":
+            parts.append("\t")
+        elif child.tag == ODF_TEXT_NS + "line-break":
+            parts.append("\n")
+        elif child.tag != ODF_TEXT_NS + "note":
+            parts.append(_odf_paragraph(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def _extract_zip_xml(filepath, member, label, blocks):
+    """Stream member of a zip container through blocks(), which yields
+    text lines; the first chunk is an ExtractError if the file can't be read."""
+    import zipfile
+
+    try:
+        z = zipfile.ZipFile(filepath, "r")
+    except zipfile.BadZipFile:
+        yield _error(f"Invalid {label} file")
+        return
+    except Exception as e:
+        yield _error(f"Failed to parse {label}: {e}")
+        return
+
+    produced = False
+    with z:
+        try:
+            with z.open(member) as f:
+                for line in blocks(f):
+                    if line.strip():
+                        produced = True
+                        yield line + "\n"
+        except KeyError:
+            yield _error(f"Invalid {label} file: no {member}")
+            return
+        except Exception as e:
+            yield _error(f"Failed to parse {label}: {e}", produced)
+            return
+    if not produced:
+        yield f"[Info] No text content found in {label}"
+
+
+def _docx_blocks(f):
+    for elem in iter_xml_blocks(f, {W_NS + "p", W_NS + "tr"}):
+        if elem.tag == W_NS + "tr":
+            cells = []
+            for tc in elem.iter(W_NS + "tc"):
+                cells.append(" ".join(_docx_paragraph(p) for p in tc.iter(W_NS + "p")))
+            yield " | ".join(cells)
+        else:
+            yield _docx_paragraph(elem)
+
+
+def _odt_blocks(f):
+    paragraph_tags = {ODF_TEXT_NS + "p", ODF_TEXT_NS + "h"}
+    for elem in iter_xml_blocks(f, paragraph_tags | {ODF_TABLE_NS + "table-row"}):
+        if elem.tag == ODF_TABLE_NS + "table-row":
+            cells = []
+            for cell in elem.iter(ODF_TABLE_NS + "table-cell"):
+                cells.append(" ".join(_odf_paragraph(p) for p in cell.iter() if p.tag in paragraph_tags))
+            yield " | ".join(cells)
+        else:
+            yield _odf_paragraph(elem)
+
+
+def extract_docx(filepath, max_chars, **options):
+    """Extract text from docx by streaming word/document.xml.
+
+    Falls back to textutil for files that aren't zip containers (e.g. an
+    old binary .doc saved with a .docx name).
+    """
+    yield from _with_fallback(
+        _extract_zip_xml(filepath, "word/document.xml", "docx", _docx_blocks),
+        lambda: extract_textutil(filepath, max_chars),
+    )
+
+
+def extract_odt(filepath, max_chars, **options):
+    """Extract text from odt by streaming content.xml."""
+    yield from _with_fallback(
+        _extract_zip_xml(filepath, "content.xml", "odt", _odt_blocks),
+        lambda: extract_textutil(filepath, max_chars),
+    )
+
+
+# Pages per pdftotext process when a PDF is split for --pdf-jobs.
+PDF_RANGE_PAGES = 10
+
+
+def parse_page_range(spec):
+    """Parse "A-B", "A-" or "A" into (first, last); last is None if open."""
+    m = re.fullmatch(r"\s*(\d+)\s*(?:(-)\s*(\d*)\s*)?", spec)
+    if not m or int(m.group(1)) < 1:
+        raise ValueError(f"Invalid page range: {spec!r} (expected A-B, A- or A)")
+    first = int(m.group(1))
+    if not m.group(2):
+        return first, first
+    last = int(m.group(3)) if m.group(3) else None
+    if last is not None and last < first:
+        raise ValueError(f"Invalid page range: {spec!r} (last page before first)")
+    return first, last
+
+
+def _pdftotext_cmd(filepath, first=None, last=None):
+    cmd = ["pdftotext", "-layout"]
+    if first is not None:
+        cmd += ["-f", str(first)]
+    if last is not None:
+        cmd += ["-l", str(last)]
+    return cmd + [filepath, "-"]
+
+
+def _pdf_page_count(filepath):
+    """Page count from pdfinfo, or None if it isn't available."""
+    import subprocess
+
+    try:
+        info = "".join(run_streaming(["pdfinfo", filepath], timeout=30, max_bytes=1048576))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    m = re.search(r"^Pages:\s+(\d+)", info, re.M)
+    return int(m.group(1)) if m else None
+
+
+def _pdf_ranges_parallel(filepath, ranges, jobs, timeout, max_bytes=None):
+    """Run pdftotext over page ranges, at most jobs at a time, and yield each
+    range's text in page order.
+
+    Only jobs ranges are in flight ahead of the consumer, so stopping early
+    leaves the rest of the document unconverted; running processes are
+    killed on close. A range that fails or times out is noted in the
+    extraction trace's failed_ranges and replaced by one form feed per page,
+    so the rest of the document (and its page numbering) survives; only if
+    every range fails is the last error raised.
+    """
+    import subprocess
+    import threading
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    from contextvars import copy_context
+    from itertools import islice
+
+    procs = set()
+    lock = threading.Lock()
+    closed = []
+
+    def run(first, last):
+        started = []
+
+        def register(proc):
+            started.append(proc)
+            with lock:
+                procs.add(proc)
+                if closed:
+                    proc.kill()
+
+        try:
+            return "".join(run_streaming(_pdftotext_cmd(filepath, first, last), timeout, max_bytes, register)), None
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
+            return "\f" * (last - first + 1), e
+        finally:
+            with lock:
+                procs.difference_update(started)
+
+    def submit(first, last):
+        # A context copy per range, so the subprocess stats reach the
+        # caller's extraction trace from the pool threads.
+        return pool.submit(copy_context().run, run, first, last)
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        todo = iter(ranges)
+        pending = deque((r, submit(*r)) for r in islice(todo, jobs))
+        trace = _trace.get()
+        held = ""  # placeholders for failed ranges before the first good one
+        error = None
+        while pending:
+            (first, last), future = pending.popleft()
+            text, error = future.result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append((nxt, submit(*nxt)))
+            if error is not None and trace is not None:
+                if isinstance(error, subprocess.TimeoutExpired):
+                    reason = "timed out"
+                else:
+                    reason = error.stderr.strip() or f"exit status {error.returncode}"
+                trace.setdefault("failed_ranges", []).append({"pages": f"{first}-{last}", "error": reason})
+            if error is not None and held is not None:
+                held += text
+                continue
+            if held:
+                text = held + text
+            held = None
+            yield text
+        if held is not None and error is not None:
+            raise error
+    finally:
+        with lock:
+            closed.append(True)
+            for proc in procs:
+                proc.kill()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_pdf(filepath, max_chars, pages=None, pdf_jobs=None, **options):
+    """Extract text from PDF using pdftotext.
+
+    pages limits extraction to a range like "3-10". With pdf_jobs > 1 the
+    document is split into PDF_RANGE_PAGES-page ranges converted by parallel
+    pdftotext processes and reassembled in order.
+    """
+    import subprocess
+
+    first = last = None
+    if pages:
+        try:
+            first, last = parse_page_range(pages)
+        except ValueError as e:
+            yield _error(str(e))
+            return
+
+    count = _pdf_page_count(filepath) if pdf_jobs and pdf_jobs > 1 else None
+    if count:
+        first = first or 1
+        last = min(last or count, count)
+        ranges = [(a, min(a + PDF_RANGE_PAGES - 1, last)) for a in range(first, last + 1, PDF_RANGE_PAGES)]
+        source = _pdf_ranges_parallel(filepath, ranges, pdf_jobs, 60, output_budget(max_chars))
+    else:
+        source = run_streaming(_pdftotext_cmd(filepath, first, last), 60, output_budget(max_chars))
+
+    produced = False
+    try:
+        with closing(source) as stream:
+            # Keep leading form feeds: each one is a (blank) page that
+            # _Locator counts.
+            for chunk in _strip_stream(stream, " \t\r\n"):
+                produced = True
+                yield chunk
+    except FileNotFoundError:
+        # Fallback: try strings
+        _note_fallback()
+        yield from _extract_strings(filepath, max_chars, "pdftotext not found, using strings fallback")
+        return
+    except subprocess.TimeoutExpired:
+        yield _error("pdftotext timed out", produced)
+        return
+    except subprocess.CalledProcessError as e:
+        yield _error(f"pdftotext failed: {e.stderr.strip()}", produced)
+        return
+    if not produced:
+        yield "[Info] PDF contains no extractable text (may be scanned/image-based)"
+
+
+def _select_sheets(names, sheet):
+    """Names to extract: all of them, or just sheet (None if it's missing)."""
+    if sheet is None:
+        return names
+    return [sheet] if sheet in names else None
+
+
+def _sheet_not_found(sheet, names):
+    return _error(f"Sheet not found: {sheet} (available: {', '.join(names)})")
+
+
+OPENPYXL_EXTENSIONS = {".xlsx", ".xlsm", ".xltx", ".xltm"}
+
+
+class _SheetRow(str):
+    """A "a | b | c" line from extract_xlsx, carrying its 1-based row number
+    in the sheet for _Locator (empty rows are skipped, so lines don't tell)."""
+
+    def __new__(cls, text, row):
+        self = super().__new__(cls, text)
+        self.row = row
+        return self
+
+
+def extract_xlsx(filepath, max_chars, sheet=None, **options):
+    """Extract text from xlsx using openpyxl (if available) or XML parsing."""
+    try:
+        import openpyxl
+    except ImportError:
+        openpyxl = None
+    # openpyxl refuses paths without an Excel extension (misnamed files
+    # routed here by sniff_mime()).
+    if openpyxl is None or file_ext(filepath) not in OPENPYXL_EXTENSIONS:
+        yield from _extract_xlsx_zip(filepath, max_chars, sheet=sheet)
+        return
+
+    try:
+        wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    except Exception as e:
+        yield _error(f"Failed to read xlsx: {e}")
+        return
+
+    try:
+        sheet_names = _select_sheets(wb.sheetnames, sheet)
+        if sheet_names is None:
+            yield _sheet_not_found(sheet, wb.sheetnames)
+            return
+        for sheet_name in sheet_names:
+            ws = wb[sheet_name]
+            yield f"=== Sheet: {sheet_name} ===\n"
+
+            # Read-only sheets yield every row from min_row on, empty or not.
+            for number, row in enumerate(ws.iter_rows(min_row=1, values_only=True), 1):
+                cells = [str(c) if c is not None else "" for c in row]
+                # Skip completely empty rows
+                if not any(cells):
+                    continue
+                yield _SheetRow(" | ".join(cells) + "\n", number)
+
+            yield "\n"
+    except Exception as e:
+        yield _error(f"Failed to read xlsx: {e}")
+    finally:
+        wb.close()
+
+
+def _xlsx_shared_string_blocks(f):
+    for si in iter_xml_blocks(f, {S_NS + "si"}):
+        yield "".join(t.text or "" for t in si.iter(S_NS + "t"))
+
+
+class _SharedStrings:
+    """Shared-string table of an xlsx, parsed only as far as it is indexed.
+
+    Cells refer to strings by position; the table is streamed on first use
+    and only up to the highest index seen so far.
+    """
+
+    def __init__(self, z):
+        self._z = z
+        self._items = []
+        self._file = None
+        self._blocks = None
+
+    def __getitem__(self, index):
+        while index >= len(self._items):
+            if self._blocks is None:
+                try:
+                    self._file = self._z.open("xl/sharedStrings.xml")
+                except KeyError:
+                    return ""
+                self._blocks = _xlsx_shared_string_blocks(self._file)
+            text = next(self._blocks, None)
+            if text is None:
+                return ""
+            self._items.append(text)
+        return self._items[index]
+
+    def close(self):
+        if self._blocks is not None:
+            self._blocks.close()
+            self._file.close()
+
+
+def _xlsx_sheet_members(z):
+    """[(sheet name, zip member)] in workbook order."""
+    rel_tag = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+    rid_attr = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+    targets = {}
+    with z.open("xl/_rels/workbook.xml.rels") as f:
+        for rel in iter_xml_blocks(f, {rel_tag}):
+            target = rel.get("Target", "")
+            target = target.lstrip("/") if target.startswith("/") else "xl/" + target
+            targets[rel.get("Id")] = target
+    sheets = []
+    with z.open("xl/workbook.xml") as f:
+        for elem in iter_xml_blocks(f, {S_NS + "sheet"}):
+            member = targets.get(elem.get(rid_attr))
+            if member:
+                sheets.append((elem.get("name"), member))
+    return sheets
+
+
+def _column_index(ref):
+    """Zero-based column of a cell reference like "AB12"."""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index - 1
+
+
+def _xlsx_cell(c, shared):
+    """Display value of a <c> element, as openpyxl would stringify it."""
+    kind = c.get("t")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in c.iter(S_NS + "t"))
+    v = c.find(S_NS + "v")
+    if v is None or v.text is None:
+        return ""
+    if kind == "s":
+        return shared[int(v.text)]
+    if kind == "b":
+        return "True" if v.text == "1" else "False"
+    return v.text
+
+
+def _xlsx_rows(f, shared):
+    """Yield "a | b | c" lines (as _SheetRow) for the non-empty rows of a
+    worksheet.
+
+    Like openpyxl, rows are padded to the width <dimension ref> gives.
+    """
+    number = 0
+    width = 0
+    for row in iter_xml_blocks(f, {S_NS + "dimension", S_NS + "row"}):
+        if row.tag == S_NS + "dimension":
+            width = _column_index(row.get("ref", "A").split(":")[-1]) + 1
+            continue
+        # r is optional; without it rows follow one another.
+        number = int(row.get("r") or number + 1)
+        cells = []
+        for c in row.iter(S_NS + "c"):
+            ref = c.get("r")
+            if ref:
+                # Sparse rows omit empty cells; pad to keep columns aligned.
+                cells.extend([""] * (_column_index(ref) - len(cells)))
+            cells.append(_xlsx_cell(c, shared))
+        cells.extend([""] * (width - len(cells)))
+        if any(cells):
+            yield _SheetRow(" | ".join(cells) + "\n", number)
+
+
+def _extract_xlsx_zip(filepath, max_chars, sheet=None, **options):
+    """Fallback xlsx extraction via zipfile XML parsing.
+
+    Streams each worksheet's rows and resolves shared strings lazily, with
+    the same output as the openpyxl path. Dates come out as their serial
+    numbers since cell styles aren't read.
+    """
+    import zipfile
+
+    try:
+        z = zipfile.ZipFile(filepath, "r")
+    except zipfile.BadZipFile:
+        yield _error("Invalid xlsx file")
+        return
+    except Exception as e:
+        yield _error(f"Failed to parse xlsx: {e}")
+        return
+
+    with z:
+        try:
+            sheets = _xlsx_sheet_members(z)
+        except Exception as e:
+            yield _error(f"Failed to parse xlsx: {e}")
+            return
+        names = [name for name, _ in sheets]
+        selected = _select_sheets(names, sheet)
+        if selected is None:
+            yield _sheet_not_found(sheet, names)
+            return
+
+        shared = _SharedStrings(z)
+        try:
+            for name, member in sheets:
+                if name not in selected:
+                    continue
+                yield f"=== Sheet: {name} ===\n"
+                with z.open(member) as f:
+                    yield from _xlsx_rows(f, shared)
+                yield "\n"
+        except Exception as e:
+            yield _error(f"Failed to parse xlsx: {e}")
+        finally:
+            shared.close()
+
+
+def extract_xls(filepath, max_chars, **options):
+    """Extract text from old .xls format."""
+    # Try textutil first
+    yield from _with_fallback(
+        extract_textutil(filepath, max_chars),
+        lambda: _extract_strings(filepath, max_chars, "xls format, using strings extraction"),
+    )
+
+
+def extract_pptx(filepath, max_chars, **options):
+    """Extract text from pptx via zipfile XML parsing.
+
+    Slides are streamed in numeric order (slide2 before slide10) and each
+    <a:t> run is emitted as it is parsed.
+    """
+    import zipfile
+
+    try:
+        z = zipfile.ZipFile(filepath, "r")
+    except zipfile.BadZipFile:
+        yield _error("Invalid pptx file")
+        return
+    except Exception as e:
+        yield _error(f"Failed to parse pptx: {e}")
+        return
+
+    with z:
+        slides = []
+        for name in z.namelist():
+            m = re.fullmatch(r"ppt/slides/slide(\d+)\.xml", name)
+            if m:
+                slides.append((int(m.group(1)), name))
+        if not slides:
+            yield "[Info] No text content found in pptx"
+            return
+
+        for slide_num, slide_file in sorted(slides):
+            yield f"=== Slide {slide_num} ===\n"
+            try:
+                with z.open(slide_file) as f:
+                    sep = ""
+                    for t in iter_xml_blocks(f, {A_NS + "t"}):
+                        if t.text:
+                            yield sep + t.text
+                            sep = " "
+            except Exception as e:
+                yield f"\n[Error] Failed to parse pptx: {e}"
+                return
+            yield "\n\n"
+
+
+def extract_ppt(filepath, max_chars, **options):
+    """Extract text from old .ppt format."""
+    yield from _with_fallback(
+        extract_textutil(filepath, max_chars),
+        lambda: _extract_strings(filepath, max_chars, "ppt format, using strings extraction"),
+    )
+
+
+# Runs of at least 4 printable characters, like strings(1), in two separate
+# scans: UTF-8 (ASCII plus 3-byte sequences, which covers CJK) and UTF-16LE
+# (ASCII, CJK and full-width forms), which is how old Office files store
+# text. A CJK code unit's high byte can be a printable ASCII byte, so plain
+# ASCII also scans as "UTF-16"; _string_runs() settles such overlaps.
+_UTF8_RUN = re.compile(rb"(?:[\t\x20-\x7e]|[\xe0-\xef][\x80-\xbf]{2}){4,}")
+# A unit like "\0s" followed by "\0" is UTF-16 ASCII read one byte early,
+# which would otherwise swallow the run's first word.
+_UTF16_RUN = re.compile(rb"(?:[\t\x20-\x7e]\x00|(?!\x00[\t\x20-\x7e]\x00)[\x00-\xff][\x30\x4e-\x9f\xff]){4,}")
+_WORD = re.compile(r"\w")
+# Random bytes look like UTF-16 CJK far more often than like ASCII, so
+# non-ASCII UTF-16 runs must be longer to count as text.
+MIN_UTF16_CJK_RUN = 8
+
+
+# Every UTF-8 character and UTF-16 code unit of a run has at least one of
+# these bytes: printable ASCII, UTF-8 CJK lead/continuation bytes and the
+# high bytes _UTF16_RUN accepts. Where none occur for STRINGS_GAP_BYTES in a
+# row there is no text, and bytes.find skips such stretches (zero padding,
+# say) far faster than the run patterns can.
+_TEXT_BYTE_CLASS = bytes(
+    1 if b in b"\t\x7f\xff" or 0x20 <= b < 0x7f or 0x80 <= b < 0xc0 or 0xe0 <= b < 0xf0 else 0
+    for b in range(256)
+)
+STRINGS_GAP_BYTES = 64
+STRINGS_BLOCK_BYTES = 4 * 1048576
+# The strings scan stops here and reports the text as truncated; random
+# binary data scans at only a few MB/s.
+STRINGS_SECONDS = 10
+
+
+def _text_regions(data):
+    """Yield (start, end) spans of data outside which there are no text runs."""
+    gap = b"\0" * STRINGS_GAP_BYTES
+    size = len(data)
+    pos = 0
+    while pos < size:
+        end = min(pos + STRINGS_BLOCK_BYTES, size)
+        classes = data[pos:end].translate(_TEXT_BYTE_CLASS)
+        nxt = end
+        i = classes.find(1)
+        while i != -1:
+            j = classes.find(gap, i)
+            if j == -1:
+                if end < size and i > 0:
+                    # May run on past the block: scan it with the next one.
+                    nxt = pos + i
+                    break
+                j = len(classes)
+            # One byte of margin each side: a UTF-16 code unit may start
+            # with (or a run end on) a byte outside the class.
+            yield max(pos + i - 1, 0), min(pos + j + 1, size)
+            i = classes.find(1, j)
+        pos = nxt
+
+
+def _string_runs(data, start=0, end=None):
+    """Yield (encoding, text) for the printable runs in data[start:end], in
+    file order.
+
+    Where a UTF-8 run and a UTF-16 run overlap, the UTF-8 one wins unless it
+    covers less than half of the UTF-16 run's bytes: ASCII words read at
+    either byte alignment look like CJK code units, whereas a genuine UTF-16
+    CJK string only rarely contains a long stretch of printable bytes.
+    """
+    import heapq
+
+    end = len(data) if end is None else end
+    runs = heapq.merge(
+        ((m.start(), m.end(), "utf-8") for m in _UTF8_RUN.finditer(data, start, end)),
+        ((m.start(), m.end(), "utf-16-le") for m in _UTF16_RUN.finditer(data, start, end)),
+    )
+    held = None
+    for run in runs:
+        if held is not None and run[0] < held[1]:
+            u8, u16 = (held, run) if held[2] == "utf-8" else (run, held)
+            held = u8 if 2 * (u8[1] - u8[0]) >= u16[1] - u16[0] else u16
+            continue
+        if held is not None:
+            yield held[2], data[held[0]:held[1]].decode(held[2], "replace")
+        held = run
+    if held is not None:
+        yield held[2], data[held[0]:held[1]].decode(held[2], "replace")
+
+
+def _extract_strings(filepath, max_chars, note=""):
+    """Last-resort extraction: scan the file for printable text runs.
+
+    Works over an mmap of the file in-process and stops as soon as the
+    caller has enough, so huge binaries are neither copied nor fully read.
+    Only the regions _text_regions() finds are scanned, and the scan gives
+    up after STRINGS_SECONDS, noting the text as truncated in the trace.
+    """
+    produced = False
+    deadline = time.monotonic() + STRINGS_SECONDS
+    try:
+        with _mapped(filepath) as mm:
+            for start, end in _text_regions(mm):
+                if time.monotonic() > deadline:
+                    trace = _trace.get()
+                    if trace is not None:
+                        trace["truncated"] = True
+                    break
+                for encoding, line in _string_runs(mm, start, end):
+                    if encoding == "utf-16-le" and len(line) < MIN_UTF16_CJK_RUN and not line.isascii():
+                        continue
+                    # Filter likely text (contains CJK or reasonable ASCII)
+                    line = line.strip()
+                    if len(line) < 2 or not _WORD.search(line):
+                        continue
+                    if not produced and note:
+                        yield f"[Note] {note}\n\n"
+                    yield line if not produced else "\n" + line
+                    produced = True
+    except Exception as e:
+        yield _error(f"strings extraction failed: {e}", produced)
+        return
+    if not produced:
+        yield "[Info] No extractable text found"
+
+
+def extract_binary(filepath, max_chars, **options):
+    """Extract text runs from a binary file of no known format."""
+    return _extract_strings(filepath, max_chars, "Binary file, using strings extraction")
+
+
+def extract_zip(filepath, max_chars, **options):
+    """List the members of a zip archive that is not a known document."""
+    import zipfile
+
+    try:
+        z = zipfile.ZipFile(filepath)
+    except Exception as e:
+        yield _error(f"Failed to open zip: {e}")
+        return
+
+    with z:
+        infos = z.infolist()
+        yield f"[Info] ZIP archive with {len(infos)} entries\n\n"
+        for info in infos:
+            yield f"{info.filename} ({info.file_size} bytes)\n"
+
+
+# Extension to extractor mapping. Register more with register_extractor() or
+# an "extract_text.backends" entry point.
+EXTRACTORS = {
+    # Direct text
+    ".txt": read_direct,
+    ".md": read_direct,
+    ".csv": read_csv,
+    ".tsv": read_csv,
+    ".json": read_json,
+    ".jsonl": read_json,
+    ".ndjson": read_json,
+    ".yaml": read_direct,
+    ".yml": read_direct,
+    ".xml": read_direct,
+    ".log": read_direct,
+    ".ini": read_direct,
+    ".conf": read_direct,
+    ".toml": read_direct,
+    # Source code
+    ".py": read_direct,
+    ".swift": read_direct,
+    ".js": read_direct,
+    ".ts": read_direct,
+    ".jsx": read_direct,
+    ".tsx": read_direct,
+    ".html": read_direct,
+    ".css": read_direct,
+    ".sh": read_direct,
+    ".go": read_direct,
+    ".rs": read_direct,
+    ".java": read_direct,
+    ".c": read_direct,
+    ".h": read_direct,
+    ".cpp": read_direct,
+    ".m": read_direct,
+    ".rb": read_direct,
+    ".php": read_direct,
+    ".sql": read_direct,
+    # Documents
+    ".doc": extract_textutil,
+    ".docx": extract_docx,
+    ".rtf": extract_textutil,
+    ".odt": extract_odt,
+    ".pages": extract_textutil,
+    # Spreadsheets
+    ".xlsx": extract_xlsx,
+    ".xls": extract_xls,
+    # Presentations
+    ".pptx": extract_pptx,
+    ".ppt": extract_ppt,
+    # PDF
+    ".pdf": extract_pdf,
+    # Archives
+    ".zip": extract_zip,
+}
+
+
+# MIME type to extractor mapping, for callers that know the content type.
+MIME_EXTRACTORS = {
+    "text/plain": read_direct,
+    "text/csv": read_csv,
+    "application/json": read_json,
+    "application/rtf": extract_textutil,
+    "application/msword": extract_textutil,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": extract_docx,
+    "application/vnd.oasis.opendocument.text": extract_odt,
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": extract_xlsx,
+    "application/vnd.ms-excel": extract_xls,
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": extract_pptx,
+    "application/vnd.ms-powerpoint": extract_ppt,
+    "application/pdf": extract_pdf,
+    "application/zip": extract_zip,
+    "application/x-ole-storage": extract_binary,
+    "application/octet-stream": extract_binary,
+}
+
+# Signatures too generic to pick a backend on their own; a known extension
+# wins over them (.pages is a zip, .msg an OLE2 file, ...).
+GENERIC_MIMES = {"application/zip", "application/x-ole-storage", "application/octet-stream"}
+
+# Backends for formats that always start with a signature. A file with one of
+# these extensions but no signature is misnamed, so it is read as text.
+SIGNED_EXTRACTORS = {extract_docx, extract_odt, extract_xlsx, extract_pptx, extract_pdf, extract_zip}
+
+# Plain-text backends. They are cheaper to re-run than to look up in the
+# cache (which has to stat and possibly hash the file), so they bypass it.
+TEXT_EXTRACTORS = {read_direct, read_csv, read_json}
+
+ENTRY_POINT_GROUP = "extract_text.backends"
+_entry_points_loaded = False
+
+
+def register_extractor(extractor, extensions=(), mimes=()):
+    """Route files with these extensions (".epub") or MIME types to extractor.
+
+    An extractor is called as extractor(filepath, max_chars, **options) and
+    yields text chunks; see iter_extract().
+    """
+    for ext in extensions:
+        EXTRACTORS[ext.lower()] = extractor
+    for mime in mimes:
+        MIME_EXTRACTORS[mime] = extractor
+
+
+def _lazy_backend(entry_point):
+    """Wrap an entry point so its module is only imported when first called."""
+    loaded = []
+
+    def backend(filepath, max_chars, **options):
+        if not loaded:
+            loaded.append(entry_point.load())
+        return loaded[0](filepath, max_chars, **options)
+
+    backend.__name__ = entry_point.value
+    return backend
+
+
+def _load_entry_points():
+    """Register third-party backends from installed packages, once.
+
+    Entry point names are extensions (".epub") or MIME types; built-in
+    backends take precedence. Only runs when a lookup misses, so files the
+    built-in table handles never pay for scanning installed packages.
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    try:
+        from importlib.metadata import entry_points
+
+        found = entry_points(group=ENTRY_POINT_GROUP)
+    except Exception:
+        return
+    for ep in found:
+        table = MIME_EXTRACTORS if "/" in ep.name else EXTRACTORS
+        table.setdefault(ep.name.lower() if table is EXTRACTORS else ep.name, _lazy_backend(ep))
+
+
+def file_ext(filepath):
+    """Lower-cased extension of filepath, including the dot."""
+    return os.path.splitext(filepath)[1].lower()
+
+
+# sniff_mime() reads this much of a file once; PDF headers may follow up to
+# 1 KB of junk, everything else is at offset 0.
+SNIFF_HEAD_BYTES = 8192
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_MAGIC = b"PK\x03\x04"
+# Marker members of OOXML packages.
+ZIP_MARKERS = [
+    ("word/document.xml", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ("xl/workbook.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ("ppt/presentation.xml", "application/vnd.openxmlformats-officedocument.presentationml.presentation"),
+]
+# Stream names in the OLE2 root directory of old Office files.
+OLE2_STREAMS = [
+    ("WordDocument", "application/msword"),
+    ("Workbook", "application/vnd.ms-excel"),
+    ("Book", "application/vnd.ms-excel"),
+    ("PowerPoint Document", "application/vnd.ms-powerpoint"),
+]
+
+
+def _zip_mime(f, head):
+    """MIME type of a zip container: its stored "mimetype" member (ODF,
+    EPUB) or an OOXML marker member, else application/zip."""
+    import struct
+    import zipfile
+
+    method, size, name_len, extra_len = struct.unpack_from("<H10xIHH", head, 8)
+    start = 30 + name_len + extra_len
+    if method == 0 and head[30:30 + name_len] == b"mimetype" and start + size <= len(head):
+        mime = head[start:start + size].decode("ascii", "replace").strip()
+        if mime:
+            return mime
+    try:
+        with zipfile.ZipFile(f) as z:
+            names = set(z.namelist())
+            if "mimetype" in names:
+                mime = z.read("mimetype")[:200].decode("ascii", "replace").strip()
+                if mime:
+                    return mime
+    except Exception:
+        return "application/zip"
+    for member, mime in ZIP_MARKERS:
+        if member in names:
+            return mime
+    return "application/zip"
+
+
+def _ole2_mime(f, head):
+    """MIME type of an OLE2 compound file from the stream names in its first
+    directory sector, else application/x-ole-storage."""
+    import struct
+
+    sector_shift, = struct.unpack_from("<H", head, 0x1E)
+    first_dir, = struct.unpack_from("<I", head, 0x30)
+    if not 7 <= sector_shift <= 16:
+        return "application/x-ole-storage"
+    f.seek((first_dir + 1) << sector_shift)
+    directory = f.read(1 << sector_shift)
+    names = set()
+    for off in range(0, len(directory) - 127, 128):
+        name_len, = struct.unpack_from("<H", directory, off + 0x40)
+        if 2 <= name_len <= 64:
+            names.add(directory[off:off + name_len - 2].decode("utf-16-le", "replace"))
+    for stream, mime in OLE2_STREAMS:
+        if stream in names:
+            return mime
+    return "application/x-ole-storage"
+
+
+# Control bytes that don't occur in text files.
+_BINARY_BYTE = re.compile(rb"[\x00-\x08\x0e-\x1f\x7f]")
+
+
+def _is_utf8(head):
+    """Whether a byte prefix decodes as UTF-8 (a cut-off last character is fine)."""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def sniff_mime(filepath):
+    """Guess the MIME type of filepath from its leading bytes.
+
+    Recognises PDF (signature at the start, or after binary junk; a
+    text-extension file that decodes as UTF-8 isn't taken for one), RTF,
+    OLE2 (doc/xls/ppt), zip containers (OOXML, ODF, plain zip) and Unicode
+    BOMs ("text/plain"). Returns
+    "application/octet-stream" for other data containing NUL bytes and None
+    for everything else, which is most likely text.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            head = f.read(SNIFF_HEAD_BYTES)
+            if head.startswith(OLE2_MAGIC) and len(head) >= 512:
+                return _ole2_mime(f, head)
+            if head.startswith(ZIP_MAGIC) and len(head) >= 30:
+                return _zip_mime(f, head)
+    except OSError:
+        return None
+    pos = head.find(b"%PDF-", 0, 1024)
+    # Readers accept junk (e.g. a MacBinary header) before the signature,
+    # but text that merely mentions it doesn't make a PDF.
+    if pos == 0 or (pos > 0 and _BINARY_BYTE.search(head, 0, pos)):
+        if not (EXTRACTORS.get(file_ext(filepath)) in TEXT_EXTRACTORS and _is_utf8(head)):
+            return "application/pdf"
+    if head.startswith(b"{\\rtf"):
+        return "application/rtf"
+    for bom, _ in BOMS:
+        if head.startswith(bom):
+            return "text/plain"
+    if b"\0" in head:
+        return "application/octet-stream"
+    return None
+
+
+def _extract_unknown(filepath, max_chars, **options):
+    """Try direct read for unknown text-like files, otherwise strings."""
+    ext = file_ext(filepath)
+    return _with_fallback(
+        read_direct(filepath, max_chars),
+        lambda: _extract_strings(filepath, max_chars, f"Unknown format {ext}"),
+    )
+
+
+def resolve_extractor(filepath, mime=None):
+    """Return the extractor function for filepath.
+
+    The content decides: mime defaults to sniff_mime(filepath). The
+    extension only breaks ties, when the signature is generic (a plain zip
+    or OLE2 container, unknown binary data) or absent (text), or names a
+    type no backend handles.
+    """
+    if mime is None:
+        mime = sniff_mime(filepath)
+    ext = file_ext(filepath)
+    by_ext = EXTRACTORS.get(ext)
+    by_mime = MIME_EXTRACTORS.get(mime)
+    if (by_ext is None and ext) or (by_mime is None and mime):
+        _load_entry_points()
+        by_ext = EXTRACTORS.get(ext)
+        by_mime = MIME_EXTRACTORS.get(mime)
+
+    if mime is None:
+        if by_ext is None or by_ext in SIGNED_EXTRACTORS:
+            return _extract_unknown
+        return by_ext
+    if mime == "text/plain":
+        return by_ext if by_ext in TEXT_EXTRACTORS else read_direct
+    if by_ext is not None and (mime in GENERIC_MIMES or by_mime is None):
+        return by_ext
+    return by_mime or extract_binary
+
+
+def iter_extract(filepath, max_chars=50000, **options):
+    """Yield text chunks from file, routed by its content (see
+    resolve_extractor()).
+
+    max_chars is a hint for backends that size their reads; the caller is
+    responsible for stopping, see extract(). options are passed through to
+    backends that understand them (e.g. sheet for xlsx).
+    """
+    return resolve_extractor(filepath)(filepath, max_chars, **options)
+
+
+def take(chunks, max_chars):
+    """Collect up to max_chars from a chunk stream, then close it.
+
+    Returns (text, truncated); text is an ExtractError if the backend
+    failed. Closing the generator stops the backend, so any subprocess or
+    parser behind it does no further work.
+    """
+    parts = []
+    total = 0
+    truncated = False
+    failed = False
+    try:
+        for chunk in chunks:
+            if not parts:
+                failed = isinstance(chunk, ExtractError)
+            if total + len(chunk) > max_chars:
+                parts.append(chunk[: max_chars - total])
+                truncated = True
+                break
+            parts.append(chunk)
+            total += len(chunk)
+    finally:
+        chunks.close()
+    text = "".join(parts)
+    return ExtractError(text) if failed else text, truncated
+
+
+# Bump when extractor output changes so stale cache entries are ignored.
+CACHE_VERSION = 9
+DEFAULT_CACHE_BYTES = 256 * 1048576
+# On a cache miss files up to this size are hashed, so renamed or touched
+# copies still hit. Larger ones are keyed by path and stat alone (hashing
+# hundreds of MB costs more than extracting a budget's worth of pages)
+# until batch/index dedup hashes them anyway, see ExtractionCache.digest().
+CACHE_HASH_MAX_BYTES = 16 * 1048576
+
+
+def default_cache_dir():
+    """Per-user cache directory (honours XDG_CACHE_HOME)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "extract_text")
+
+
+def file_digest(filepath):
+    """BLAKE2b digest of the file contents, read in 1 MB blocks."""
+    import hashlib
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(filepath, "rb") as f:
+        while True:
+            block = f.read(1048576)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """On-disk cache of extracted text, backed by SQLite.
+
+    Files are looked up by (path, size, mtime_ns, inode) first; on a miss
+    the content hash is computed (up to CACHE_HASH_MAX_BYTES) so renamed,
+    copied or touched files still hit. Text is stored per extractor together with the budget it was
+    extracted with, and evicted least-recently-used once the total exceeds
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_BYTES):
+        import sqlite3
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._hashes = {}
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "cache.sqlite"), timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                stat_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT NOT NULL,
+                extractor TEXT NOT NULL,
+                max_chars INTEGER NOT NULL,
+                truncated INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, extractor)
+            );
+            CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs(last_used);
+            """
+        )
+
+    @staticmethod
+    def _stat_key(filepath):
+        st = os.stat(filepath)
+        path = os.path.abspath(filepath)
+        return f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0{st.st_ino}"
+
+    def _lookup(self, content_hash, extractor, max_chars):
+        row = self.conn.execute(
+            "SELECT max_chars, truncated, text FROM blobs WHERE content_hash = ? AND extractor = ?",
+            (content_hash, extractor),
+        ).fetchone()
+        if row is None:
+            return None
+        stored_max, stored_truncated, text = row
+        # A truncated entry only answers requests within its budget.
+        if stored_truncated and max_chars > stored_max:
+            return None
+        with self.conn:
+            self.conn.execute(
+                "UPDATE blobs SET last_used = ? WHERE content_hash = ? AND extractor = ?",
+                (time.time(), content_hash, extractor),
+            )
+        if len(text) > max_chars:
+            return text[:max_chars], True
+        return text, bool(stored_truncated)
+
+    @staticmethod
+    def _stat_hash(stat_key):
+        """Stand-in content key for a file too large to hash on every miss."""
+        import hashlib
+
+        return "stat:" + hashlib.blake2b(stat_key.encode("utf-8", "surrogateescape"), digest_size=20).hexdigest()
+
+    def _content_key(self, filepath, stat_key):
+        if os.path.getsize(filepath) > CACHE_HASH_MAX_BYTES:
+            return self._stat_hash(stat_key)
+        return file_digest(filepath)
+
+    def digest(self, filepath):
+        """Content hash of filepath, remembered by stat key across runs."""
+        stat_key = self._stat_key(filepath)
+        row = self.conn.execute(
+            "SELECT content_hash FROM files WHERE stat_key = ?", (stat_key,)
+        ).fetchone()
+        if row is not None and not row[0].startswith("stat:"):
+            return row[0]
+        content_hash = file_digest(filepath)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (stat_key, content_hash) VALUES (?, ?)",
+                (stat_key, content_hash),
+            )
+            if row is not None:
+                # Text stored under the stand-in key now belongs to the content.
+                self.conn.execute(
+                    "UPDATE OR REPLACE blobs SET content_hash = ? WHERE content_hash = ?",
+                    (content_hash, row[0]),
+                )
+        return content_hash
+
+    def get(self, filepath, extractor, max_chars):
+        """Return (text, truncated) for filepath, or None on a miss."""
+        stat_key = self._stat_key(filepath)
+        row = self.conn.execute(
+            "SELECT content_hash FROM files WHERE stat_key = ?", (stat_key,)
+        ).fetchone()
+        if row is not None:
+            # Known content (e.g. hashed by digest()) that isn't stored yet.
+            self._hashes[stat_key] = row[0]
+            return self._lookup(row[0], extractor, max_chars)
+
+        content_hash = self._content_key(filepath, stat_key)
+        self._hashes[stat_key] = content_hash
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (stat_key, content_hash) VALUES (?, ?)",
+                (stat_key, content_hash),
+            )
+        return self._lookup(content_hash, extractor, max_chars)
+
+    def put(self, filepath, extractor, max_chars, text, truncated):
+        """Store an extraction result; errors are never cached."""
+        if isinstance(text, ExtractError):
+            return
+        stat_key = self._stat_key(filepath)
+        content_hash = self._hashes.pop(stat_key, None) or self._content_key(filepath, stat_key)
+        size = len(text.encode("utf-8"))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (stat_key, content_hash) VALUES (?, ?)",
+                (stat_key, content_hash),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, extractor, max_chars, int(truncated), text, size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute(
+            "SELECT rowid, bytes FROM blobs ORDER BY last_used"
+        ).fetchall()
+        doomed = []
+        for rowid, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((rowid,))
+            total -= size
+        self.conn.executemany("DELETE FROM blobs WHERE rowid = ?", doomed)
+        self.conn.execute(
+            "DELETE FROM files WHERE content_hash NOT IN (SELECT content_hash FROM blobs)"
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+def open_cache(cache_dir):
+    """Open the extraction cache, or return None if it is unusable."""
+    import sqlite3
+
+    try:
+        return ExtractionCache(cache_dir)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1)
+
+
+def _mark_first(chunks, marks):
+    """Pass chunks through, appending the time the first one arrived to marks."""
+    try:
+        for chunk in chunks:
+            if not marks:
+                marks.append(time.perf_counter())
+            yield chunk
+    finally:
+        chunks.close()
+
+
+def extract_report(filepath, max_chars=50000, cache=None, tail=False, **options):
+    """Extract text and describe how it went, as a JSON-ready dict.
+
+    Keys: path, format (extension), size, extractor, fallback_used, cached,
+    truncated, chars, timings_ms and text -- or error instead of text when
+    the backend failed. timings_ms splits the time into open (format
+    detection, cache lookup, backend start-up until its first chunk),
+    convert (the rest of the backend) and postprocess (cache write).
+    fallback_used is None for cache hits, which don't know. subprocesses
+    lists each converter run with its exit status, wall and CPU time, peak
+    RSS and why it was stopped early, if it was (see run_streaming()).
+    failed_ranges, present only when some pages of a --pdf-jobs run failed,
+    lists those page ranges and why; their text is missing and the result
+    isn't cached.
+
+    With tail=True the last max_chars characters of a plain-text file are
+    returned instead; tails are never cached since logs keep growing.
+    Other options go to the backend, see iter_extract().
+    """
+    started = time.perf_counter()
+    options = {k: v for k, v in options.items() if v is not None}
+    record = {"path": filepath, "format": file_ext(filepath), "size": os.path.getsize(filepath)}
+    extractor = resolve_extractor(filepath)
+    record.update(extractor=extractor.__name__, fallback_used=False, cached=False, truncated=False, chars=0)
+    marks = []
+    trace = {}
+    if tail:
+        if extractor not in (read_direct, _extract_unknown):
+            text, truncated = _error("--tail is only supported for plain-text formats"), False
+        else:
+            record["extractor"] = read_tail.__name__
+            marks.append(time.perf_counter())
+            text, truncated = read_tail(filepath, max_chars)
+        hit = None
+    else:
+        if extractor in TEXT_EXTRACTORS:
+            cache = None
+        key = f"{extractor.__name__}:v{CACHE_VERSION}"
+        for name, value in sorted(options.items()):
+            key += f":{name}={value}"
+        hit = cache.get(filepath, key, max_chars) if cache is not None else None
+        if hit is not None:
+            text, truncated = hit
+            record.update(fallback_used=None, cached=True)
+        else:
+            token = _trace.set(trace)
+            try:
+                chunks = _mark_first(extractor(filepath, max_chars, **options), marks)
+                text, truncated = take(chunks, max_chars)
+            finally:
+                _trace.reset(token)
+            # A backend that gave up early (e.g. on a time budget) says so here.
+            truncated = truncated or trace.get("truncated", False)
+            record["fallback_used"] = trace.get("fallback_used", False)
+    converted = time.perf_counter()
+    complete = not (trace.get("failed_ranges") or trace.get("truncated"))
+    if not tail and hit is None and cache is not None and complete:
+        cache.put(filepath, key, max_chars, text, truncated)
+    finished = time.perf_counter()
+
+    opened = marks[0] if marks else converted
+    record["timings_ms"] = {
+        "open": _ms(started, opened),
+        "convert": _ms(opened, converted),
+        "postprocess": _ms(converted, finished),
+    }
+    record["subprocesses"] = trace.get("subprocesses", [])
+    if trace.get("failed_ranges"):
+        record["failed_ranges"] = trace["failed_ranges"]
+    if isinstance(text, ExtractError):
+        record.update(truncated=False, chars=0, error=text)
+    else:
+        record.update(truncated=truncated, chars=len(text), text=text)
+    return record
+
+
+def extract_result(filepath, max_chars=50000, cache=None, tail=False, **options):
+    """Extract text, returning (text, truncated); see extract_report()."""
+    record = extract_report(filepath, max_chars, cache, tail, **options)
+    return record.get("text", record.get("error")), record["truncated"]
+
+
+def extract(filepath, max_chars=50000, cache=None, tail=False, **options):
+    """Extract text from file based on extension."""
+    text, truncated = extract_result(filepath, max_chars, cache, tail, **options)
+    return mark_truncated(text, truncated, tail)
+
+
+# Locator kinds for --chunk-size: which markers in an extractor's output tell
+# where in the source document a character came from.
+LOCATOR_KINDS = {extract_pdf: "page", extract_pptx: "slide", extract_xlsx: "sheet"}
+_SLIDE_MARKER = re.compile(r"=== Slide (\d+) ===")
+_SHEET_MARKER = re.compile(r"=== Sheet: (.*) ===")
+
+
+class _Locator:
+    """Maps offsets in extracted text back to source positions.
+
+    Fed the text as it streams, it watches for the markers backends emit:
+    form feeds between pdftotext pages, "=== Slide N ===" from extract_pptx
+    and "=== Sheet: NAME ===" plus one line per non-empty row from
+    extract_xlsx, whose sheet row number comes with the chunk (_SheetRow).
+    Positions also carry the 1-based line number.
+    """
+
+    def __init__(self, kind, first_page=1):
+        self.kind = kind
+        self.state = {"page": first_page} if kind == "page" else {}
+        # The state applying from offsets[i] on is states[i].
+        self.offsets = [0]
+        self.states = [dict(self.state)]
+        self.newlines = []
+        self.pending = ""
+        self.length = 0
+
+    def _change(self, offset, **changes):
+        self.state.update(changes)
+        if self.offsets[-1] == offset:
+            self.states[-1] = dict(self.state)
+        else:
+            self.offsets.append(offset)
+            self.states.append(dict(self.state))
+
+    def feed(self, text):
+        start = self.length
+        self.length += len(text)
+        pos = text.find("\n")
+        while pos != -1:
+            self.newlines.append(start + pos)
+            pos = text.find("\n", pos + 1)
+        if self.kind == "page":
+            pos = text.find("\f")
+            while pos != -1:
+                self._change(start + pos + 1, page=self.state["page"] + 1)
+                pos = text.find("\f", pos + 1)
+        elif self.kind is not None:
+            # Markers are whole lines; keep a partial last line for later.
+            row = getattr(text, "row", None)
+            line_start = start - len(self.pending)
+            lines = (self.pending + text).split("\n")
+            self.pending = lines.pop()
+            for line in lines:
+                self._line(line_start, line, row)
+                line_start += len(line) + 1
+
+    def finish(self):
+        """The text is complete: account for a last line without a newline."""
+        if self.pending:
+            self._line(self.length - len(self.pending), self.pending)
+            self.pending = ""
+
+    def _line(self, offset, line, row=None):
+        if self.kind == "slide":
+            m = _SLIDE_MARKER.fullmatch(line)
+            if m:
+                self._change(offset, slide=int(m.group(1)))
+        elif self.kind == "sheet":
+            m = _SHEET_MARKER.fullmatch(line)
+            if m:
+                self._change(offset, sheet=m.group(1), row=0)
+            elif line.strip() and "sheet" in self.state:
+                self._change(offset, row=row if row is not None else self.state["row"] + 1)
+
+    def position(self, offset):
+        """Source position of the character at offset."""
+        import bisect
+
+        pos = dict(self.states[bisect.bisect_right(self.offsets, offset) - 1])
+        if pos.get("row") == 0:
+            del pos["row"]
+        pos["line"] = bisect.bisect_left(self.newlines, offset) + 1
+        return pos
+
+
+def _chunk_end(buf, size):
+    """Where to end a chunk of at most size chars of buf: after the last
+    page break, else line break, else space in its second half; otherwise
+    at size."""
+    if len(buf) <= size:
+        return len(buf)
+    for sep in ("\f", "\n", " "):
+        cut = buf.rfind(sep, size // 2, size)
+        if cut != -1:
+            return cut + 1
+    return size
+
+
+def _chunk_record(index, start, text, locator):
+    return {
+        "index": index,
+        "start": start,
+        "end": start + len(text),
+        "locator": {
+            "start": locator.position(start),
+            "end": locator.position(start + len(text) - 1),
+        },
+        "text": text,
+    }
+
+
+def iter_chunks(filepath, chunk_size, overlap=0, max_chars=50000, **options):
+    """Yield the extracted text of filepath as overlapping chunk records.
+
+    Each record is {"index", "start", "end", "locator": {"start", "end"},
+    "text"}. start and end are character offsets into the full extracted
+    text, and each chunk starts overlap characters before the previous one
+    ends. The locator gives the source position of the first and last
+    character: page, slide or sheet/row where the format has one, and the
+    line. Chunks are produced as the backend streams, so the first arrives
+    before the document is fully converted. The last record gets
+    "truncated": true if max_chars cut the text short. A backend error is
+    yielded as {"error": ...}.
+    """
+    options = {k: v for k, v in options.items() if v is not None}
+    extractor = resolve_extractor(filepath)
+    first_page = parse_page_range(options["pages"])[0] if options.get("pages") else 1
+    locator = _Locator(LOCATOR_KINDS.get(extractor), first_page)
+    buf = ""
+    base = 0  # offset of buf[0]
+    emitted = 0  # end offset of the last chunk
+    total = 0
+    index = 0
+    truncated = False
+
+    with closing(extractor(filepath, max_chars, **options)) as chunks:
+        for chunk in chunks:
+            if total == 0 and isinstance(chunk, ExtractError):
+                yield {"error": chunk}
+                return
+            if total + len(chunk) > max_chars:
+                chunk = chunk[: max_chars - total]
+                truncated = True
+            total += len(chunk)
+            locator.feed(chunk)
+            if truncated:
+                locator.finish()
+            buf += chunk
+            while len(buf) > chunk_size:
+                end = _chunk_end(buf, chunk_size)
+                record = _chunk_record(index, base, buf[:end], locator)
+                emitted = base + end
+                if truncated and emitted == total:
+                    record["truncated"] = True
+                yield record
+                index += 1
+                step = max(end - overlap, 1)
+                buf = buf[step:]
+                base += step
+            if truncated:
+                break
+    locator.finish()
+    if base + len(buf) > emitted:
+        record = _chunk_record(index, base, buf, locator)
+        if truncated:
+            record["truncated"] = True
+        yield record
+
+
+_worker_caches = {}
+
+
+def _batch_worker(filepath, max_chars, cache_dir=None, options=None):
+    """Extract one file for --batch; runs inside a pool worker."""
+    started = time.perf_counter()
+    try:
+        cache = _worker_cache(cache_dir)
+        record = extract_report(filepath, max_chars, cache, **(options or {}))
+    except Exception as e:
+        record = {"path": filepath, "format": file_ext(filepath)}
+        record["error"] = f"[Error] {type(e).__name__}: {e}"
+    record["elapsed_ms"] = _ms(started, time.perf_counter())
+    return record
+
+
+def _read_paths(source, null_separated):
+    """Read a path list from a file, or stdin when source is '-'."""
+    if source == "-":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    if null_separated:
+        entries = data.split(b"\0")
+    else:
+        entries = [line.rstrip(b"\r") for line in data.split(b"\n")]
+    return [os.fsdecode(p) for p in entries if p.strip()]
+
+
+def _digest_worker(filepath, cache_dir=None):
+    """Content hash of one file for _duplicate_groups(); runs in a pool worker."""
+    try:
+        cache = _worker_cache(cache_dir)
+        return cache.digest(filepath) if cache is not None else file_digest(filepath)
+    except Exception:
+        return None
+
+
+def _duplicate_groups(pool, paths, cache_dir=None):
+    """Map each path to extract to the byte-identical copies it stands for.
+
+    Only files that share their size with another file are hashed (over
+    the pool, through the cache's stat-keyed hash table when there is one).
+    Copies must also share the extension, which can steer backend choice.
+    """
+    by_size = {}
+    for p in paths:
+        try:
+            by_size.setdefault(os.path.getsize(p), []).append(p)
+        except OSError:
+            pass
+    candidates = [p for group in by_size.values() if len(group) > 1 for p in group]
+    groups = {p: [] for p in paths}
+    first = {}
+    digests = pool.map(_digest_worker, candidates, [cache_dir] * len(candidates), chunksize=16)
+    for p, digest in zip(candidates, digests):
+        if digest is None:
+            continue
+        kept = first.setdefault((digest, file_ext(p)), p)
+        if kept != p and p in groups:
+            groups[kept].append(p)
+            del groups[p]
+    return groups
+
+
+# Batch engine (_pool_records). Backends that drive a converter process spend
+# their time waiting on its pipe, so they run on threads of the batch process;
+# pure-Python parsers run in the worker pool. Each converter backend gets its
+# own limit, as a share of --jobs, so a mixed batch keeps every core busy
+# without running more converters than there are cores.
+CONVERTER_SHARES = {extract_pdf: 1.0, extract_textutil: 0.5, extract_xls: 0.5, extract_ppt: 0.5}
+
+
+def backend_limits(jobs, options=None):
+    """Concurrent extractions allowed per converter-backed extractor."""
+    limits = {fn: max(1, int(jobs * share)) for fn, share in CONVERTER_SHARES.items()}
+    pdf_jobs = (options or {}).get("pdf_jobs")
+    if pdf_jobs and pdf_jobs > 1:
+        # Each PDF then runs pdf_jobs pdftotext processes at once.
+        limits[extract_pdf] = max(1, jobs // pdf_jobs)
+    return limits
+
+
+def _worker_cache(cache_dir):
+    """This worker's (or thread's) connection to the cache in cache_dir."""
+    import threading
+
+    if not cache_dir:
+        return None
+    key = (cache_dir, threading.get_ident())
+    if key not in _worker_caches:
+        _worker_caches[key] = open_cache(cache_dir)
+    return _worker_caches[key]
+
+
+def _resolve_quietly(filepath):
+    try:
+        return resolve_extractor(filepath)
+    except Exception:
+        return None
+
+
+async def _engine(pool, paths, max_chars, cache_dir, options, jobs, results):
+    """Extract paths, putting each record on the results queue as it is done;
+    None marks the end. See _pool_records()."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    limits = backend_limits(jobs, options)
+    gates = {fn: asyncio.Semaphore(n) for fn, n in limits.items()}
+    groups = await loop.run_in_executor(None, _duplicate_groups, pool, paths, cache_dir)
+
+    async def run(path, threads):
+        extractor = None
+        if not (options or {}).get("tail"):
+            extractor = await loop.run_in_executor(threads, _resolve_quietly, path)
+        gate = gates.get(extractor)
+        try:
+            if gate is None:
+                record = await loop.run_in_executor(
+                    pool, _batch_worker, path, max_chars, cache_dir, options
+                )
+            else:
+                async with gate:
+                    record = await loop.run_in_executor(
+                        threads, _batch_worker, path, max_chars, cache_dir, options
+                    )
+        except Exception as e:
+            # A worker died (e.g. killed by the OS); report and carry on.
+            record = {"path": path, "error": f"[Error] {type(e).__name__}: {e}"}
+        await results.put(record)
+        for copy in groups[path]:
+            await results.put(
+                dict(record, path=copy, format=file_ext(copy), duplicate_of=path, elapsed_ms=0.0)
+            )
+
+    with ThreadPoolExecutor(max_workers=sum(limits.values()) + jobs) as threads:
+        await asyncio.gather(*(run(path, threads) for path in groups))
+    await results.put(None)
+
+
+def _pool_records(pool, paths, max_chars, cache_dir, options=None, jobs=None):
+    """Extract paths and yield their records as each one finishes.
+
+    An asyncio loop schedules the work: converter-backed files (see
+    CONVERTER_SHARES) on threads under per-backend limits, everything else
+    on pool. Byte-identical files are extracted once; the other copies get
+    the same record with their own path and duplicate_of naming the
+    extracted one.
+    """
+    import asyncio
+
+    jobs = jobs or os.cpu_count() or 4
+
+    async def start():
+        results = asyncio.Queue()
+        engine = _engine(pool, paths, max_chars, cache_dir, options, jobs, results)
+        return results, asyncio.ensure_future(engine)
+
+    # Records are handed out from a loop driven step by step, so callers
+    # keep a plain generator (and can write each record as it arrives).
+    loop = asyncio.new_event_loop()
+    task = None
+    try:
+        results, task = loop.run_until_complete(start())
+        while True:
+            record = loop.run_until_complete(results.get())
+            if record is None:
+                break
+            yield record
+    finally:
+        if task is not None:
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+def _warm_worker():
+    """Pool initializer: import what the backends load lazily, once per worker."""
+    import json  # noqa: F401
+    import subprocess  # noqa: F401
+    import zipfile  # noqa: F401
+    import xml.etree.ElementTree  # noqa: F401
+
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _serve_client(rfile, wfile, pool, cache_dir):
+    """One daemon connection: JSON request lines in, JSON record lines out.
+
+    Each request is {"path": ..., "max_chars": N, "no_cache": bool,
+    "options": {...}} where options are extract_result() keywords such as
+    tail or sheet. The client half-closes after sending; records come back
+    in completion order.
+    """
+    import json
+    from concurrent.futures import as_completed
+
+    def send(record):
+        wfile.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        wfile.flush()
+
+    futures = {}
+    for line in rfile:
+        if not line.strip():
+            continue
+        try:
+            req = json.loads(line)
+            path = req["path"]
+            max_chars = int(req.get("max_chars", 50000))
+        except (ValueError, KeyError, TypeError) as e:
+            send({"error": f"[Error] Bad request: {e}"})
+            continue
+        future = pool.submit(
+            _batch_worker,
+            path,
+            max_chars,
+            None if req.get("no_cache") else cache_dir,
+            dict(req.get("options") or {}),
+        )
+        futures[future] = path
+
+    for future in as_completed(futures):
+        try:
+            record = future.result()
+        except Exception as e:
+            record = {"path": futures[future], "error": f"[Error] {type(e).__name__}: {e}"}
+        send(record)
+
+
+def serve(socket_path, jobs, cache_dir=None):
+    """Run the extraction daemon on a Unix socket until interrupted.
+
+    A stale socket left at socket_path is replaced; raises FileExistsError
+    if the path is something else or a daemon is still listening on it.
+    """
+    import stat
+    import signal
+    import socketserver
+    import threading
+    from concurrent.futures import ProcessPoolExecutor
+
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f"{socket_path} exists and is not a socket")
+        sock = connect_daemon(socket_path)
+        if sock is not None:
+            sock.close()
+            raise FileExistsError(f"a daemon is already listening on {socket_path}")
+        os.unlink(socket_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            _serve_client(self.rfile, self.wfile, self.server.pool, self.server.cache_dir)
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker) as pool:
+        # Owner-only from the moment bind() creates it; a chmod afterwards
+        # would leave a window where anyone could connect.
+        umask = os.umask(0o177)
+        try:
+            server = Server(socket_path, Handler)
+        finally:
+            os.umask(umask)
+        with server:
+            server.pool = pool
+            server.cache_dir = cache_dir
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+            print(f"Serving on {socket_path} with {jobs} workers", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(socket_path)
+
+
+def run_batch(paths, max_chars, jobs, cache_dir=None, socket_path=None, options=None):
+    """Extract many files in parallel (see _pool_records()), printing JSON Lines.
+
+    Records are printed as soon as each file finishes, so one slow PDF only
+    holds up its own worker. With socket_path, a running daemon does the
+    work instead of a local pool. Returns the number of failed files.
+    """
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+
+    sock = connect_daemon(socket_path) if socket_path else None
+    failures = 0
+    with ProcessPoolExecutor(max_workers=jobs) if sock is None else nullcontext() as pool:
+        if sock is None:
+            records = _pool_records(pool, paths, max_chars, cache_dir, options, jobs)
+        else:
+            records = daemon_records(sock, paths, max_chars, cache_dir is not None, options)
+        for record in records:
+            if "error" in record:
+                failures += 1
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+    return failures
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="extract_text.py serve",
+        description="Run a long-lived extraction daemon on a Unix socket",
+    )
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 4,
+        help="Number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        help="Extraction cache directory (default: ~/.cache/extract_text)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Disable the extraction cache")
+    args = parser.parse_args(argv)
+    cache_dir = None if args.no_cache else os.path.expanduser(args.cache_dir)
+    try:
+        serve(os.path.expanduser(args.socket), max(1, args.jobs), cache_dir)
+    except FileExistsError as e:
+        print(f"[Error] {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+# Full-text index (index / search subcommands). Documents are extracted with
+# a larger budget than one-off reads, since search should see whole files.
+INDEX_MAX_CHARS = 1000000
+INDEX_COMMIT_EVERY = 200
+
+
+def default_index_path():
+    """Default index database, next to the extraction cache."""
+    return os.path.join(default_cache_dir(), "index.sqlite")
+
+
+def open_index(db_path):
+    """Open the index database at db_path, creating its tables if needed.
+
+    docs holds one row per file (stat and extraction outcome); docs_fts is
+    an FTS5 table over path and text sharing docs.id as rowid. The trigram
+    tokenizer matches substrings, so CJK text without word breaks is
+    searchable too; older SQLite falls back to the default tokenizer.
+    """
+    import sqlite3
+
+    parent = os.path.dirname(db_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS docs ("
+        " id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, size INTEGER,"
+        " mtime_ns INTEGER, format TEXT, chars INTEGER, truncated INTEGER, error TEXT)"
+    )
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'docs_fts'").fetchone():
+        try:
+            db.execute("CREATE VIRTUAL TABLE docs_fts USING fts5(path, text, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            db.execute("CREATE VIRTUAL TABLE docs_fts USING fts5(path, text)")
+    db.commit()
+    return db
+
+
+def _walk_documents(root):
+    """Yield (path, stat) for files under root with a known extension,
+    skipping hidden files and directories."""
+    import stat
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.startswith(".") or file_ext(name) not in EXTRACTORS:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                yield path, st
+
+
+def _index_record(db, record, st):
+    """Replace the index rows for record["path"] with a fresh extraction."""
+    path = record["path"]
+    row = db.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+    if row:
+        db.execute("DELETE FROM docs_fts WHERE rowid = ?", row)
+        db.execute("DELETE FROM docs WHERE id = ?", row)
+    cur = db.execute(
+        "INSERT INTO docs (path, size, mtime_ns, format, chars, truncated, error)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            path,
+            st.st_size,
+            st.st_mtime_ns,
+            record.get("format"),
+            record.get("chars", 0),
+            int(bool(record.get("truncated"))),
+            record.get("error"),
+        ),
+    )
+    if "text" in record:
+        db.execute(
+            "INSERT INTO docs_fts (rowid, path, text) VALUES (?, ?, ?)",
+            (cur.lastrowid, path, record["text"]),
+        )
+
+
+def index_tree(root, db_path, jobs, max_chars=INDEX_MAX_CHARS, cache_dir=None):
+    """Index the documents under root into db_path.
+
+    Only files that are new or whose size or mtime changed since the last
+    run are extracted, in parallel over a process pool; rows for files that
+    disappeared are dropped. Byte-identical copies are extracted once, and
+    with cache_dir content already extracted by an earlier run (under any
+    name) comes from the extraction cache. Failed extractions are recorded
+    (and not retried until the file changes). Returns a dict of counts.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    root = os.path.abspath(root)
+    prefix = os.path.join(root, "")
+    _load_entry_points()
+    db = open_index(db_path)
+    try:
+        known = {
+            path: (doc_id, size, mtime_ns)
+            for path, doc_id, size, mtime_ns in db.execute(
+                "SELECT path, id, size, mtime_ns FROM docs WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            )
+        }
+        changed = {}
+        unchanged = 0
+        for path, st in _walk_documents(root):
+            row = known.pop(path, None)
+            if row is not None and row[1:] == (st.st_size, st.st_mtime_ns):
+                unchanged += 1
+            else:
+                changed[path] = st
+
+        for doc_id, _, _ in known.values():
+            db.execute("DELETE FROM docs_fts WHERE rowid = ?", (doc_id,))
+            db.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+        db.commit()
+
+        failed = duplicates = 0
+        if changed:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker) as pool:
+                records = _pool_records(pool, list(changed), max_chars, cache_dir, jobs=jobs)
+                for n, record in enumerate(records, 1):
+                    if "error" in record:
+                        failed += 1
+                    if "duplicate_of" in record:
+                        duplicates += 1
+                    _index_record(db, record, changed[record["path"]])
+                    if n % INDEX_COMMIT_EVERY == 0:
+                        db.commit()
+            db.commit()
+    finally:
+        db.close()
+    return {
+        "indexed": len(changed),
+        "duplicates": duplicates,
+        "unchanged": unchanged,
+        "removed": len(known),
+        "failed": failed,
+    }
+
+
+def _phrase_query(query):
+    """Quote every word of query so FTS5 syntax characters match literally."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+# Phrases and bare words of an FTS5 query, minus operators and syntax.
+_QUERY_TERM = re.compile(r'"([^"]+)"|([^\s"()*^:+]+)')
+_QUERY_OPERATORS = {"AND", "OR", "NOT", "NEAR"}
+SNIPPET_CHARS = 160
+# The trigram tokenizer can't match anything shorter (e.g. a two-character
+# Chinese word), so queries with such a term are answered by a scan.
+MIN_TRIGRAM_TERM = 3
+
+
+def _query_terms(query):
+    """The phrases and words of an FTS5 query, without operators."""
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(query):
+        if phrase or word not in _QUERY_OPERATORS:
+            terms.append(phrase or word)
+    return terms
+
+
+def _snippet(text, query):
+    """Text around the first match of any query term, terms in [brackets].
+
+    Built here rather than with FTS5's snippet(), which slows down
+    quadratically on long documents with many hits.
+    """
+    terms = set(_query_terms(query))
+    pattern = None
+    start = 0
+    if terms:
+        pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.I)
+        m = pattern.search(text)
+        if m:
+            start = max(0, m.start() - SNIPPET_CHARS // 4)
+    window = text[start:start + SNIPPET_CHARS]
+    if pattern is not None:
+        window = pattern.sub(lambda m: f"[{m.group()}]", window)
+    prefix = "..." if start else ""
+    suffix = "..." if start + SNIPPET_CHARS < len(text) else ""
+    return prefix + " ".join(window.split()) + suffix
+
+
+def search_index(db_path, query, limit=10):
+    """Search the index; returns [(path, snippet, score)], best first.
+
+    query is FTS5 syntax (words, "phrases", OR, NEAR, prefix*); if it
+    doesn't parse, its words are matched literally instead. A query with a
+    term shorter than MIN_TRIGRAM_TERM is answered by a substring scan
+    that requires every term (operators are ignored) and scores documents
+    by how often the terms occur.
+    """
+    import sqlite3
+
+    terms = _query_terms(query)
+    if any(len(term) < MIN_TRIGRAM_TERM for term in terms):
+        return _scan_index(db_path, terms, query, limit)
+    sql = "SELECT path, text, bm25(docs_fts) FROM docs_fts WHERE docs_fts MATCH ? ORDER BY rank LIMIT ?"
+    db = sqlite3.connect(db_path)
+    try:
+        try:
+            rows = db.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            rows = db.execute(sql, (_phrase_query(query), limit)).fetchall()
+    finally:
+        db.close()
+    return [(path, _snippet(text, query), round(-score, 3)) for path, text, score in rows]
+
+
+def _scan_index(db_path, terms, query, limit):
+    """search_index() by LIKE over every document; see there."""
+    import sqlite3
+
+    where = " AND ".join(r"text LIKE ? ESCAPE '\'" for _ in terms)
+    # Occurrences of each term (case-folded like LIKE, ASCII only).
+    score = " + ".join("(length(text) - length(replace(lower(text), ?, ''))) / ?" for _ in terms)
+    params = []
+    for term in terms:
+        params += [term.lower(), len(term)]
+    for term in terms:
+        params.append("%" + re.sub(r"([\\%_])", r"\\\1", term) + "%")
+    sql = f"SELECT path, text, {score} AS hits FROM docs_fts WHERE {where} ORDER BY hits DESC, path LIMIT ?"
+    db = sqlite3.connect(db_path)
+    try:
+        rows = db.execute(sql, params + [limit]).fetchall()
+    finally:
+        db.close()
+    return [(path, _snippet(text, query), float(hits)) for path, text, hits in rows]
+
+
+def index_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="extract_text.py index",
+        description="Extract the documents under a directory into a full-text index",
+    )
+    parser.add_argument("directory", help="Directory to index (recursively)")
+    parser.add_argument(
+        "--db",
+        default=default_index_path(),
+        help="Index database (default: ~/.cache/extract_text/index.sqlite)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 4,
+        help="Number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--max-chars",
+        type=int,
+        default=INDEX_MAX_CHARS,
+        help=f"Maximum characters indexed per file (default: {INDEX_MAX_CHARS})",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        help="Extraction cache directory (default: ~/.cache/extract_text)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Disable the extraction cache")
+    args = parser.parse_args(argv)
+    directory = os.path.expanduser(args.directory)
+    if not os.path.isdir(directory):
+        parser.error(f"not a directory: {directory}")
+
+    started = time.perf_counter()
+    try:
+        counts = index_tree(
+            directory,
+            os.path.expanduser(args.db),
+            max(1, args.jobs),
+            args.max_chars,
+            None if args.no_cache else os.path.expanduser(args.cache_dir),
+        )
+    except Exception as e:
+        print(f"[Error] Indexing failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"Indexed {counts['indexed']} files ({counts['duplicates']} duplicates, "
+        f"{counts['failed']} failed), "
+        f"{counts['unchanged']} unchanged, {counts['removed']} removed "
+        f"in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+
+
+def search_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="extract_text.py search",
+        description="Search an index built with 'index'",
+    )
+    parser.add_argument("query", help='FTS5 query: words, "a phrase", a OR b, prefix*')
+    parser.add_argument(
+        "--db",
+        default=default_index_path(),
+        help="Index database (default: ~/.cache/extract_text/index.sqlite)",
+    )
+    parser.add_argument("-n", "--limit", type=int, default=10, help="Maximum results (default: 10)")
+    parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="json: one object per result",
+    )
+    args = parser.parse_args(argv)
+    db_path = os.path.expanduser(args.db)
+    if not os.path.exists(db_path):
+        print(f"[Error] Index not found: {db_path}", file=sys.stderr)
+        print("Build it first with: extract_text.py index DIR", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        results = search_index(db_path, args.query, args.limit)
+    except Exception as e:
+        print(f"[Error] Search failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.format == "json":
+        import json
+
+        for path, snippet, score in results:
+            print(json.dumps({"path": path, "score": score, "snippet": snippet}, ensure_ascii=False))
+        return
+    if not results:
+        print("[Info] No matches")
+    for path, snippet, score in results:
+        print(path)
+        print(f"    {snippet}")
+
+
+# Watch mode (watch subcommand): keep a mirror of extracted text up to date.
+WATCH_DEBOUNCE_SECONDS = 0.5
+WATCH_POLL_SECONDS = 1.0
+# <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF
+)
+
+
+class _Inotify:
+    """Recursive directory watch over the Linux inotify API (via ctypes).
+
+    events(timeout) returns (changed, removed, rescan): paths written,
+    created or moved in; paths deleted or moved out; and directories whose
+    contents must be walked because the watch was set up after they filled
+    (new subdirectories) or the kernel queue overflowed.
+    """
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        for name in ("inotify_init1", "inotify_add_watch"):
+            if not hasattr(self._libc, name):
+                raise OSError(f"{name} is not available")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        self.add_tree(root)
+
+    def add_tree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = dirpath
+
+    def events(self, timeout):
+        import select
+        import struct
+
+        changed, removed, rescan = set(), set(), set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed, removed, rescan
+        data = os.read(self.fd, 65536)
+        pos = 0
+        while pos + 16 <= len(data):
+            wd, mask, _cookie, length = struct.unpack_from("iIII", data, pos)
+            name = os.fsdecode(data[pos + 16:pos + 16 + length].rstrip(b"\0"))
+            pos += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                rescan.update(self._dirs.values())
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None or not name or name.startswith("."):
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                    rescan.add(path)
+                elif mask & IN_MOVED_FROM:
+                    removed.add(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.add(path)
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+                changed.add(path)
+        return changed, removed, rescan
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Poller:
+    """Fallback for systems without inotify: diff os.stat snapshots."""
+
+    def __init__(self, root):
+        self.root = root
+        self._seen = {path: (st.st_size, st.st_mtime_ns) for path, st in _walk_documents(root)}
+
+    def events(self, timeout):
+        time.sleep(timeout)
+        current = {path: (st.st_size, st.st_mtime_ns) for path, st in _walk_documents(self.root)}
+        changed = {path for path, sig in current.items() if self._seen.get(path) != sig}
+        removed = set(self._seen) - set(current)
+        self._seen = current
+        return changed, removed, set()
+
+    def close(self):
+        pass
+
+
+def _write_atomic(path, text):
+    """Replace path with text so readers never see a partial file."""
+    import tempfile
+
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Watcher:
+    """Mirror the documents under root as text files under out_dir.
+
+    root/a/b.pdf is extracted to out_dir/a/b.pdf.txt. Files are only
+    re-extracted after WATCH_DEBOUNCE_SECONDS without further events, so a
+    burst of writes (or a slow copy) costs one extraction. Every update is
+    reported as a JSON line on stdout.
+    """
+
+    def __init__(self, root, out_dir, max_chars=50000, cache=None, options=None):
+        self.root = os.path.abspath(root)
+        self.out_dir = os.path.abspath(out_dir)
+        self.max_chars = max_chars
+        self.cache = cache
+        self.options = options or {}
+        self._pending = {}
+
+    def output_path(self, path):
+        return os.path.join(self.out_dir, os.path.relpath(path, self.root) + ".txt")
+
+    def wanted(self, path, removed=False):
+        """Whether an event for path concerns a mirrored document. Removals
+        also count for directories and files that no longer qualify."""
+        if os.path.commonpath([path, self.out_dir]) == self.out_dir:
+            return False
+        rel = os.path.relpath(path, self.root)
+        if any(part.startswith(".") for part in rel.split(os.sep)):
+            return False
+        return removed or file_ext(path) in EXTRACTORS
+
+    def _documents(self, top):
+        prefix = os.path.join(self.out_dir, "")
+        for path, st in _walk_documents(top):
+            if not path.startswith(prefix):
+                yield path, st
+
+    def sync(self):
+        """Extract documents whose mirror is missing or older than the file."""
+        for path, st in self._documents(self.root):
+            try:
+                if os.stat(self.output_path(path)).st_mtime_ns >= st.st_mtime_ns:
+                    continue
+            except OSError:
+                pass
+            self.update(path)
+
+    def _report(self, **fields):
+        import json
+
+        print(json.dumps(fields, ensure_ascii=False), flush=True)
+
+    def update(self, path):
+        out = self.output_path(path)
+        if not os.path.isfile(path):
+            self.remove(path)
+            return
+        record = extract_report(path, self.max_chars, self.cache, **self.options)
+        if "error" in record:
+            self._report(event="failed", path=path, error=record["error"])
+            return
+        text = mark_truncated(record["text"], record["truncated"])
+        _write_atomic(out, text)
+        self._report(event="updated", path=path, output=out, chars=record["chars"],
+                     truncated=record["truncated"])
+
+    def remove(self, path):
+        out = self.output_path(path)
+        mirror_dir = os.path.join(self.out_dir, os.path.relpath(path, self.root))
+        if os.path.isfile(out):
+            os.unlink(out)
+            self._report(event="removed", path=path, output=out)
+        elif os.path.isdir(mirror_dir) and not os.path.isdir(path):
+            # A directory was deleted or moved away: drop its whole mirror.
+            import shutil
+
+            shutil.rmtree(mirror_dir)
+            self._report(event="removed", path=path, output=mirror_dir)
+
+    def run(self, source):
+        """Process events from source (_Inotify or _Poller) until interrupted."""
+        while True:
+            timeout = WATCH_POLL_SECONDS
+            if self._pending:
+                timeout = max(0.0, min(self._pending.values()) - time.monotonic())
+            changed, removed, rescan = source.events(timeout)
+            now = time.monotonic()
+            for top in rescan:
+                changed.update(path for path, _ in self._documents(top))
+            for path in changed | removed:
+                if self.wanted(path, path in removed):
+                    self._pending[path] = now + WATCH_DEBOUNCE_SECONDS
+            for path, due in list(self._pending.items()):
+                if due <= now:
+                    del self._pending[path]
+                    self.update(path)
+
+
+def watch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="extract_text.py watch",
+        description="Keep extracted text of the documents under a directory up to date",
+    )
+    parser.add_argument("directory", help="Directory to watch (recursively)")
+    parser.add_argument("--out", required=True, metavar="DIR", help="Where to write <file>.txt mirrors")
+    parser.add_argument(
+        "--max-chars",
+        type=int,
+        default=50000,
+        help="Maximum characters to extract per file (default: 50000)",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll for changes instead of using inotify (always the case off Linux)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        help="Extraction cache directory (default: ~/.cache/extract_text)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Disable the extraction cache")
+    args = parser.parse_args(argv)
+    directory = os.path.expanduser(args.directory)
+    if not os.path.isdir(directory):
+        parser.error(f"not a directory: {directory}")
+
+    _load_entry_points()
+    cache = None if args.no_cache else open_cache(os.path.expanduser(args.cache_dir))
+    watcher = Watcher(directory, os.path.expanduser(args.out), args.max_chars, cache)
+    source = None
+    if not args.poll and sys.platform.startswith("linux"):
+        try:
+            source = _Inotify(watcher.root)
+        except OSError as e:
+            print(f"[Note] inotify unavailable ({e}), polling instead", file=sys.stderr)
+    if source is None:
+        source = _Poller(watcher.root)
+    print(f"Watching {watcher.root} -> {watcher.out_dir}", file=sys.stderr)
+    try:
+        # Catch up after the watch is in place, so no change falls in between.
+        watcher.sync()
+        watcher.run(source)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+        if cache is not None:
+            cache.close()
+
+
+def main():
+    subcommands = {
+        "serve": serve_main,
+        "index": index_main,
+        "search": search_main,
+        "watch": watch_main,
+    }
+    if len(sys.argv) > 1 and sys.argv[1] in subcommands:
+        subcommands[sys.argv[1]](sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Extract text from documents")
+    parser.add_argument("filepath", nargs="*", help="Path to the file (several with --batch)")
+    parser.add_argument(
+        "--max-chars",
+        type=int,
+        default=50000,
+        help="Maximum characters to extract (default: 50000)",
+    )
+    parser.add_argument(
+        "--tail",
+        action="store_true",
+        help="Take the last --max-chars characters instead of the first (plain-text files, e.g. logs)",
+    )
+    parser.add_argument(
+        "--sheet",
+        metavar="NAME",
+        help="xlsx: only extract the named sheet",
+    )
+    parser.add_argument(
+        "--pages",
+        metavar="A-B",
+        help="pdf: only extract this page range (e.g. 5-20, 30-, 7)",
+    )
+    parser.add_argument(
+        "--pdf-jobs",
+        type=int,
+        metavar="N",
+        help="pdf: split into page ranges and run N pdftotext processes in parallel",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="csv/tsv: print dialect, columns with inferred types, null counts and "
+        "min/max, an approximate row count and a sample of rows instead of the rows",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="json: print one object with path, format, size, extractor, "
+        "fallback_used, truncated, chars, timings_ms, subprocesses and text (or error)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        metavar="N",
+        help="Stream the text as JSON Lines chunks of at most N characters, "
+        "with character offsets and source locators (page/slide/sheet row)",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=0,
+        metavar="M",
+        help="With --chunk-size: characters shared by consecutive chunks (default: 0)",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Extract many files in parallel and print one JSON object per file",
+    )
+    parser.add_argument(
+        "--files-from",
+        metavar="FILE",
+        help="With --batch: read paths from FILE, one per line ('-' for stdin)",
+    )
+    parser.add_argument(
+        "-0",
+        "--null",
+        action="store_true",
+        help="Paths from --files-from are NUL-separated (e.g. find -print0)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 4,
+        help="With --batch: number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        help="Extraction cache directory (default: ~/.cache/extract_text)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always re-extract; neither read nor update the cache",
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("EXTRACT_TEXT_SOCKET"),
+        help="Forward to a daemon started with 'serve' if one is listening "
+        "(default: $EXTRACT_TEXT_SOCKET); falls back to extracting locally",
+    )
+    args = parser.parse_args()
+    socket_path = os.path.expanduser(args.socket) if args.socket else None
+    if args.pages:
+        try:
+            parse_page_range(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.chunk_size is not None:
+        if args.chunk_size < 1 or not 0 <= args.overlap < args.chunk_size:
+            parser.error("--chunk-size must be positive and --overlap in [0, chunk size)")
+        if args.tail or args.batch:
+            parser.error("--chunk-size can't be combined with --tail or --batch")
+    options = {
+        "tail": args.tail,
+        "sheet": args.sheet,
+        "pages": args.pages,
+        "pdf_jobs": args.pdf_jobs,
+        "profile": args.profile or None,
+    }
+    cache_dir = None if args.no_cache else os.path.expanduser(args.cache_dir)
+
+    if args.batch:
+        paths = list(args.filepath)
+        if args.files_from:
+            paths.extend(_read_paths(args.files_from, args.null))
+        if not paths:
+            parser.error("--batch needs file paths or --files-from")
+        paths = [os.path.expanduser(p) for p in paths]
+        failures = run_batch(paths, args.max_chars, max(1, args.jobs), cache_dir, socket_path, options)
+        sys.exit(1 if failures == len(paths) else 0)
+
+    if len(args.filepath) != 1:
+        parser.error("expected exactly one file path (use --batch for several)")
+
+    filepath = os.path.expanduser(args.filepath[0])
+
+    if not os.path.exists(filepath):
+        print(f"[Error] File not found: {filepath}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.chunk_size is not None:
+        import json
+
+        del options["tail"]
+        for record in iter_chunks(filepath, args.chunk_size, args.overlap, args.max_chars, **options):
+            print(json.dumps({"path": filepath, **record}, ensure_ascii=False), flush=True)
+            if "error" in record:
+                sys.exit(1)
+        return
+
+    sock = connect_daemon(socket_path) if socket_path else None
+    if sock is not None:
+        record = next(daemon_records(sock, [filepath], args.max_chars, cache_dir is not None, options))
+    else:
+        cacheable = cache_dir and resolve_extractor(filepath) not in TEXT_EXTRACTORS
+        cache = open_cache(cache_dir) if cacheable else None
+        record = extract_report(filepath, args.max_chars, cache, **options)
+
+    print_record(filepath, record, args.format, args.tail)
+
@@ -14,12 +14,16 @@ Supports:
 import argparse
 import json
 import os
+import random
 import sys
 import re
+import threading
+import time
 from datetime import datetime
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 # Load environment
 # Resolution order:
@@ -49,6 +53,153 @@ HEADERS = {
 
 BASE_URL = "https://api.notion.com"
 
+# Notion allows an average of three requests per second per integration
+# (https://developers.notion.com/reference/request-limits).
+RATE_LIMIT_PER_SEC = 3.0
+RATE_LIMIT_BURST = 3
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # seconds; doubled per attempt, with full jitter
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 60
+POOL_SIZE = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "DELETE"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    start = max(self.updated, self.paused_until)
+                    self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every caller back for seconds (e.g. after a 429). Overlapping
+        pauses from concurrent callers don't add up."""
+        with self.lock:
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class NotionClient:
+    """Shared HTTP client for the Notion API.
+
+    Keeps connections alive in a pooled requests.Session, paces requests
+    with a token bucket tuned to Notion's rate limit, and retries 429
+    responses (honouring Retry-After) with jittered exponential backoff.
+    5xx responses and connection errors are only retried for requests that
+    are safe to repeat: GET/DELETE, or calls made with idempotent=True.
+    """
+
+    def __init__(self, token: str = None, version: str = None,
+                 rate: float = RATE_LIMIT_PER_SEC, max_retries: int = MAX_RETRIES):
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        if version:
+            self.session.headers["Notion-Version"] = version
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.bucket = TokenBucket(rate, RATE_LIMIT_BURST)
+        self.max_retries = max_retries
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(resp) -> float:
+        try:
+            return max(0.0, float(resp.headers.get("Retry-After", "")))
+        except ValueError:
+            return 0.0
+
+    def request(self, method: str, url: str, idempotent: bool = None, **kwargs) -> requests.Response:
+        """Send a request, retrying rate limits and transient failures.
+
+        Args:
+            method: HTTP method
+            url: Full URL, or a path such as /v1/pages/{id}
+            idempotent: Whether 5xx responses and connection errors may be
+                retried (default: only for GET and DELETE)
+            **kwargs: Passed to requests.Session.request (json, params, ...)
+
+        Returns:
+            requests.Response: The last response received
+        """
+        method = method.upper()
+        if url.startswith("/"):
+            url = BASE_URL + url
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt == self.max_retries:
+                    raise
+                reason = type(e).__name__
+                delay = self._backoff(attempt)
+            else:
+                retryable = resp.status_code == 429 or (idempotent and resp.status_code in RETRY_STATUSES)
+                if not retryable or attempt == self.max_retries:
+                    return resp
+                reason = str(resp.status_code)
+                delay = self._backoff(attempt)
+                if resp.status_code == 429:
+                    delay = max(delay, self._retry_after(resp))
+                    self.bucket.pause(delay)
+            print(f"  Retrying {method} {url[len(BASE_URL):] or url} ({reason}) in {delay:.1f}s",
+                  file=sys.stderr)
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+
+_client = None
+
+
+def get_client() -> NotionClient:
+    """Return the process-wide NotionClient, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = NotionClient()
+    return _client
+
 
 # Notion code block language mapping
 CODE_LANG_MAP = {
@@ -416,7 +567,7 @@ def markdown_to_notion_blocks(markdown: str) -> list:
 
 def verify():
     """Verify token validity."""
-    resp = requests.get(f"{BASE_URL}/v1/users/me", headers=HEADERS)
+    resp = get_client().get(f"{BASE_URL}/v1/users/me")
     if resp.status_code == 200:
         data = resp.json()
         print(f"Token valid. User: {data.get('name', 'Unknown')}")
@@ -430,10 +581,10 @@ def verify():
 
 def search(query: str):
     """Search pages and databases."""
-    resp = requests.post(
+    resp = get_client().post(
         f"{BASE_URL}/v1/search",
-        headers=HEADERS,
         json={"query": query},
+        idempotent=True,
     )
     if resp.status_code != 200:
         print(f"Error: {resp.status_code}")
@@ -469,7 +620,7 @@ def search(query: str):
 def read_page(page_id: str):
     """Read page content."""
     # Get page metadata
-    resp = requests.get(f"{BASE_URL}/v1/pages/{page_id}", headers=HEADERS)
+    resp = get_client().get(f"{BASE_URL}/v1/pages/{page_id}")
     if resp.status_code != 200:
         print(f"Error getting page: {resp.status_code}")
         print(resp.text)
@@ -493,7 +644,7 @@ def read_page(page_id: str):
     print()
 
     # Get blocks (content)
-    resp = requests.get(f"{BASE_URL}/v1/blocks/{page_id}/children", headers=HEADERS)
+    resp = get_client().get(f"{BASE_URL}/v1/blocks/{page_id}/children")
     if resp.status_code != 200:
         print(f"Error getting blocks: {resp.status_code}")
         return
@@ -547,7 +698,7 @@ def query_db(database_id: str, filter_json: str = None, sort_json: str = None, p
 
     while True:
         try:
-            resp = requests.post(url, headers=HEADERS, json=payload)
+            resp = get_client().post(url, json=payload, idempotent=True)
         except requests.RequestException as e:
             print(f"Request error: {e}")
             return
@@ -592,7 +743,7 @@ def get_db_schema(database_id: str, output_format: str = "human"):
         database_id: The database ID
         output_format: 'human' for readable output, 'json' for raw JSON
     """
-    resp = requests.get(f"{BASE_URL}/v1/databases/{database_id}", headers=HEADERS)
+    resp = get_client().get(f"{BASE_URL}/v1/databases/{database_id}")
     if resp.status_code != 200:
         print(f"Error: {resp.status_code}")
         print(resp.text)
@@ -652,7 +803,7 @@ def create_page(parent_id: str, title: str, content: str = ""):
     if children:
         payload["children"] = children
 
-    resp = requests.post(f"{BASE_URL}/v1/pages", headers=HEADERS, json=payload)
+    resp = get_client().post(f"{BASE_URL}/v1/pages", json=payload)
     if resp.status_code == 200:
         page = resp.json()
         print(f"Page created successfully!")
@@ -761,7 +912,7 @@ def create_database(parent_page_id: str, title: str, schema_json: str):
         "properties": schema,
     }
 
-    resp = requests.post(f"{BASE_URL}/v1/databases", headers=HEADERS, json=payload)
+    resp = get_client().post(f"{BASE_URL}/v1/databases", json=payload)
 
     if resp.status_code == 200:
         db = resp.json()
@@ -787,7 +938,7 @@ def create_db_item(database_id: str, title: str, properties_json: str = None, co
         content: Optional page content (text)
     """
     # First, get the database schema to know property types
-    resp = requests.get(f"{BASE_URL}/v1/databases/{database_id}", headers=HEADERS)
+    resp = get_client().get(f"{BASE_URL}/v1/databases/{database_id}")
     if resp.status_code != 200:
         print(f"Error getting database schema: {resp.status_code}")
         print(resp.text)
@@ -851,7 +1002,7 @@ def create_db_item(database_id: str, title: str, properties_json: str = None, co
     if children:
         payload["children"] = children
 
-    resp = requests.post(f"{BASE_URL}/v1/pages", headers=HEADERS, json=payload)
+    resp = get_client().post(f"{BASE_URL}/v1/pages", json=payload)
     if resp.status_code == 200:
         page = resp.json()
         print(f"Database item created successfully!")
@@ -869,16 +1020,79 @@ def create_db_item(database_id: str, title: str, properties_json: str = None, co
             print("\nHint: Check property names and values. Use 'get-db-schema' to see available properties.")
 
 
+# update_page: concurrent deletes (paced by the client's token bucket) and
+# appends in batches of the API maximum.
+DELETE_CONCURRENCY = 4
+APPEND_BATCH_SIZE = 100
+
+
+class PhaseStats:
+    """Thread-safe request latencies per phase, for update_page's summary."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.spans = {}
+
+    def record(self, phase: str, started: float):
+        """Record a request of phase that started at time.monotonic() started."""
+        now = time.monotonic()
+        with self.lock:
+            self.latencies.setdefault(phase, []).append(now - started)
+            first, _ = self.spans.get(phase, (started, now))
+            self.spans[phase] = (min(first, started), now)
+
+    def summary(self) -> list:
+        lines = []
+        for phase, samples in self.latencies.items():
+            samples = sorted(samples)
+            first, last = self.spans[phase]
+            p50 = samples[len(samples) // 2]
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            lines.append(
+                f"  {phase:<7} {len(samples):>4} requests in {last - first:6.1f}s"
+                f"  (latency p50 {p50:.2f}s, p95 {p95:.2f}s, max {samples[-1]:.2f}s)"
+            )
+        return lines
+
+
+class Progress:
+    """Thread-safe progress counter printed to stderr."""
+
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.lock = threading.Lock()
+        self.tty = sys.stderr.isatty()
+
+    def advance(self, n: int = 1):
+        with self.lock:
+            self.done += n
+            step = max(1, self.total // 10)
+            if self.tty:
+                end = "\n" if self.done >= self.total else ""
+                print(f"\r  {self.label}: {self.done}/{self.total}", end=end, file=sys.stderr, flush=True)
+            elif self.done >= self.total or self.done % step == 0:
+                print(f"  {self.label}: {self.done}/{self.total}", file=sys.stderr, flush=True)
+
+
 def update_page(page_id: str, content: str = "", content_file: str = ""):
     """Update a page by replacing all content.
 
-    Deletes all existing blocks, then appends new blocks from markdown.
+    Lists all existing blocks first, so a failed listing leaves the page
+    untouched, then deletes them concurrently (DELETE_CONCURRENCY at a
+    time, under the client's rate limit) while the new blocks are appended
+    in order, one batch at a time. Prints progress and a per-phase latency
+    summary.
 
     Args:
         page_id: The page ID to update
         content: Markdown content string
         content_file: Path to a markdown file (used if content is empty)
     """
+    from concurrent.futures import ThreadPoolExecutor
+
     # Read content from file if provided
     if not content and content_file:
         with open(content_file, "r") as f:
@@ -893,54 +1107,93 @@ def update_page(page_id: str, content: str = "", content_file: str = ""):
     if lines and lines[0].startswith("# "):
         content = "\n".join(lines[1:])
 
-    # Step 1: Get existing blocks
-    resp = requests.get(f"{BASE_URL}/v1/blocks/{page_id}/children?page_size=100", headers=HEADERS)
-    if resp.status_code != 200:
-        print(f"Error getting blocks: {resp.status_code}")
-        print(resp.text)
-        return
-
-    old_blocks = resp.json().get("results", [])
-    print(f"Deleting {len(old_blocks)} existing blocks...")
-
-    # Step 2: Delete all existing blocks
-    for block in old_blocks:
-        bid = block["id"]
-        r = requests.delete(f"{BASE_URL}/v1/blocks/{bid}", headers=HEADERS)
-        if r.status_code != 200:
-            print(f"  Warning: failed to delete block {bid}: {r.status_code}")
-
-    # Step 3: Convert markdown to blocks
+    client = get_client()
+    stats = PhaseStats()
     new_blocks = markdown_to_notion_blocks(content)
-    print(f"Appending {len(new_blocks)} new blocks...")
-
-    # Step 4: Append in batches of 100
-    total = 0
-    for i in range(0, len(new_blocks), 100):
-        batch = new_blocks[i:i + 100]
-        resp = requests.patch(
-            f"{BASE_URL}/v1/blocks/{page_id}/children",
-            headers=HEADERS,
-            json={"children": batch}
-        )
+    started_all = time.monotonic()
+
+    def delete_block(bid):
+        started = time.monotonic()
+        try:
+            status = client.delete(f"{BASE_URL}/v1/blocks/{bid}").status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        stats.record("delete", started)
+        if status != 200:
+            print(f"  Warning: failed to delete block {bid}: {status}", file=sys.stderr)
+        deleting.advance()
+        return status == 200
+
+    # Step 1: List existing blocks. Nothing is deleted until the listing is
+    # complete, so a failure here leaves the page as it was.
+    old_ids = []
+    url = f"{BASE_URL}/v1/blocks/{page_id}/children?page_size=100"
+    while url:
+        started = time.monotonic()
+        resp = client.get(url)
+        stats.record("list", started)
         if resp.status_code != 200:
-            print(f"Error appending blocks (batch {i // 100}): {resp.status_code}")
-            print(resp.text[:300])
+            print(f"Error getting blocks: {resp.status_code}")
+            print(resp.text)
             return
-        total += len(batch)
+        data = resp.json()
+        old_ids.extend(block["id"] for block in data.get("results", []))
+        url = (f"{BASE_URL}/v1/blocks/{page_id}/children?page_size=100"
+               f"&start_cursor={data['next_cursor']}" if data.get("has_more") else None)
+
+    deleting = Progress("Deleted", len(old_ids))
+    with ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY) as pool:
+        print(f"Deleting {len(old_ids)} existing blocks...")
+        deletes = [pool.submit(delete_block, bid) for bid in old_ids]
+
+        # Step 2: Append new blocks in order. The listing is complete, so
+        # nothing appended now can be mistaken for an old block, and new
+        # blocks land after the old ones whether or not those are gone yet.
+        print(f"Appending {len(new_blocks)} new blocks...")
+        appending = Progress("Appended", len(new_blocks))
+        total = 0
+        append_error = None
+        for i in range(0, len(new_blocks), APPEND_BATCH_SIZE):
+            batch = new_blocks[i:i + APPEND_BATCH_SIZE]
+            started = time.monotonic()
+            resp = client.patch(
+                f"{BASE_URL}/v1/blocks/{page_id}/children",
+                json={"children": batch}
+            )
+            stats.record("append", started)
+            if resp.status_code != 200:
+                append_error = (i // APPEND_BATCH_SIZE, resp)
+                break
+            total += len(batch)
+            appending.advance(len(batch))
 
-    # Step 5: Report
-    resp = requests.get(f"{BASE_URL}/v1/pages/{page_id}", headers=HEADERS)
-    if resp.status_code == 200:
-        page = resp.json()
-        print(f"Page updated successfully!")
-        print(f"Blocks: {total}")
-        print(f"URL: {page.get('url', 'N/A')}")
-        pub = page.get("public_url")
-        if pub:
-            print(f"Public URL: {pub}")
+        failed = sum(1 for future in deletes if not future.result())
+
+    if failed:
+        print(f"Warning: {failed} of {len(deletes)} old blocks could not be deleted")
+    if append_error:
+        batch_no, resp = append_error
+        print(f"Error appending blocks (batch {batch_no}): {resp.status_code}")
+        print(resp.text[:300])
     else:
-        print(f"Updated {total} blocks (could not fetch page info)")
+        # Step 3: Report
+        started = time.monotonic()
+        resp = client.get(f"{BASE_URL}/v1/pages/{page_id}")
+        stats.record("fetch", started)
+        if resp.status_code == 200:
+            page = resp.json()
+            print(f"Page updated successfully!")
+            print(f"Blocks: {total}")
+            print(f"URL: {page.get('url', 'N/A')}")
+            pub = page.get("public_url")
+            if pub:
+                print(f"Public URL: {pub}")
+        else:
+            print(f"Updated {total} blocks (could not fetch page info)")
+
+    print(f"Timing ({time.monotonic() - started_all:.1f}s total):")
+    for line in stats.summary():
+        print(line)
 
 
 def update_page_properties(page_id: str, properties_json: str):
@@ -951,7 +1204,7 @@ def update_page_properties(page_id: str, properties_json: str):
         properties_json: JSON string of properties to update,
             e.g. '{"Status": "done", "Priority": "high"}'
     """
-    resp = requests.get(f"{BASE_URL}/v1/pages/{page_id}", headers=HEADERS)
+    resp = get_client().get(f"{BASE_URL}/v1/pages/{page_id}")
     if resp.status_code != 200:
         print(f"Error getting page: {resp.status_code}")
         try:
@@ -979,7 +1232,7 @@ def update_page_properties(page_id: str, properties_json: str):
     db_properties = {}
 
     if database_id:
-        resp = requests.get(f"{BASE_URL}/v1/databases/{database_id}", headers=HEADERS)
+        resp = get_client().get(f"{BASE_URL}/v1/databases/{database_id}")
         if resp.status_code == 200:
             db_properties = resp.json().get("properties", {})
         else:
@@ -1020,7 +1273,7 @@ def update_page_properties(page_id: str, properties_json: str):
         return
 
     payload = {"properties": built_properties}
-    resp = requests.patch(f"{BASE_URL}/v1/pages/{page_id}", headers=HEADERS, json=payload)
+    resp = get_client().patch(f"{BASE_URL}/v1/pages/{page_id}", json=payload, idempotent=True)
 
     if resp.status_code == 200:
         updated_page = resp.json()
@@ -1054,7 +1307,7 @@ def list_children(page_id: str, output_format: str = "human"):
     all_blocks = []
     url = f"{BASE_URL}/v1/blocks/{page_id}/children?page_size=100"
     while url:
-        resp = requests.get(url, headers=HEADERS)
+        resp = get_client().get(url)
         if resp.status_code != 200:
             print(f"Error: {resp.status_code}")
             print(resp.text)
@@ -1079,7 +1332,7 @@ def list_children(page_id: str, output_format: str = "human"):
     for block in child_pages:
         title = block.get("child_page", {}).get("title", "")
         # Also fetch public_url
-        page_resp = requests.get(f"{BASE_URL}/v1/pages/{block['id']}", headers=HEADERS)
+        page_resp = get_client().get(f"{BASE_URL}/v1/pages/{block['id']}")
         public_url = ""
         if page_resp.status_code == 200:
             public_url = page_resp.json().get("public_url", "") or ""
@@ -1090,10 +1343,10 @@ def list_children(page_id: str, output_format: str = "human"):
 
 def list_databases():
     """List all accessible databases."""
-    resp = requests.post(
+    resp = get_client().post(
         f"{BASE_URL}/v1/search",
-        headers=HEADERS,
         json={"filter": {"property": "object", "value": "database"}},
+        idempotent=True,
     )
     if resp.status_code != 200:
         print(f"Error: {resp.status_code}")